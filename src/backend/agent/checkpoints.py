@@ -0,0 +1,262 @@
+"""
+task checkpoints - per-step progress that survives a backend restart
+
+Provides:
+- A checkpoint per planned run, written to disk after every step
+- Resume support: find the first failed or unrun step, optionally swap in
+  an edited command, and skip steps that already completed
+- A per-plan run claim so two runs of one plan never execute side by side
+- Only what the planner produced (id, description, command, risk) is
+  stored; safety verdicts, sudo and environment are recomputed on load
+- The installer script hashes live checkpoints pin, so the script cache
+  keeps those bytes
+
+Checkpoints are json files in LUNA_CHECKPOINT_DIR (default ~/.luna/checkpoints),
+keyed by plan id, and are pruned after LUNA_CHECKPOINT_TTL seconds.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Optional, Set
+
+from agent.plan_registry import (
+    PlanError,
+    PlanNotFoundError,
+    PlannedStep,
+    analyze_step,
+)
+
+CHECKPOINT_DIR: str = os.path.expanduser(os.getenv("LUNA_CHECKPOINT_DIR", "~/.luna/checkpoints"))
+# a week: long enough to come back to a half-finished onboarding plan
+CHECKPOINT_TTL_SECONDS: int = int(os.getenv("LUNA_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+_PLAN_ID = re.compile(r"^[0-9a-f]{32}$")
+_lock = threading.Lock()
+# plan ids with a run or resume in progress in this process
+_running: set = set()
+_running_lock = threading.Lock()
+
+
+class CheckpointNotFoundError(PlanNotFoundError):
+    """No checkpoint exists for this plan."""
+
+
+class CheckpointCorruptError(PlanError):
+    """The checkpoint file exists but cannot be read back."""
+
+
+class RunInProgressError(PlanError):
+    """Another run or resume of this plan has not finished yet."""
+
+
+# the only step fields written to disk; everything else is derived from the command
+_STORED_STEP_FIELDS = ("id", "description", "command", "risk", "source_step_ids")
+
+
+@dataclass
+class StepCheckpoint:
+    step: PlannedStep
+    status: str = "pending"  # pending | completed | failed
+    output: str = ""
+    error: Optional[str] = None
+    finished_at: Optional[float] = None
+    # hash of the installer script a curl|bash step ran, reused on re-runs
+    script_sha256: Optional[str] = None
+
+
+@dataclass
+class TaskCheckpoint:
+    plan_id: str
+    task_id: str
+    steps: List[StepCheckpoint]
+    created_at: float
+    updated_at: float
+
+    def resume_entry(self) -> Optional[StepCheckpoint]:
+        """First step that failed or never ran, or None if all completed."""
+        for entry in self.steps:
+            if entry.status != "completed":
+                return entry
+        return None
+
+
+@contextmanager
+def claim_run(plan_id: str) -> Iterator[None]:
+    """
+    Hold the plan for the duration of a run or resume.
+
+    Raises:
+        RunInProgressError: if the plan is already being run
+    """
+    with _running_lock:
+        if plan_id in _running:
+            raise RunInProgressError(f"plan {plan_id} is already running")
+        _running.add(plan_id)
+    try:
+        yield
+    finally:
+        with _running_lock:
+            _running.discard(plan_id)
+
+
+def _path(plan_id: str) -> str:
+    # plan ids come from clients; never let one escape the checkpoint dir
+    if not _PLAN_ID.match(plan_id):
+        raise CheckpointNotFoundError(f"invalid plan id: {plan_id}")
+    return os.path.join(CHECKPOINT_DIR, f"{plan_id}.json")
+
+
+def _to_json(checkpoint: TaskCheckpoint) -> dict:
+    data = asdict(checkpoint)
+    for entry, stored in zip(checkpoint.steps, data["steps"]):
+        stored["step"] = {key: getattr(entry.step, key) for key in _STORED_STEP_FIELDS}
+    return data
+
+
+def save_checkpoint(checkpoint: TaskCheckpoint) -> None:
+    """Write atomically so a crash mid-write never leaves a torn file."""
+    checkpoint.updated_at = time.time()
+    path = _path(checkpoint.plan_id)
+    tmp_path = f"{path}.tmp"
+    with _lock:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(_to_json(checkpoint), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def load_checkpoint(plan_id: str) -> TaskCheckpoint:
+    """
+    Read a checkpoint back from disk.
+
+    The file is not trusted: every step is re-analyzed from its command,
+    exactly like a freshly planned step, so an edited checkpoint can't
+    mark a blocked command safe or inject environment variables.
+
+    Raises:
+        CheckpointNotFoundError: if there is no checkpoint for the plan
+        CheckpointCorruptError: if the file can't be parsed
+    """
+    path = _path(plan_id)
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        raise CheckpointNotFoundError(f"no checkpoint for plan: {plan_id}")
+    except (OSError, json.JSONDecodeError) as e:
+        raise CheckpointCorruptError(f"checkpoint for plan {plan_id} is unreadable: {e}")
+
+    try:
+        steps = []
+        for entry in data.pop("steps"):
+            stored = entry.pop("step")
+            step = analyze_step(
+                int(stored["id"]),
+                str(stored["description"]),
+                str(stored["command"]),
+                str(stored["risk"]),
+                stored.get("source_step_ids"),
+            )
+            steps.append(StepCheckpoint(step=step, **entry))
+        return TaskCheckpoint(steps=steps, **data)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise CheckpointCorruptError(f"checkpoint for plan {plan_id} is malformed: {e}")
+
+
+def start_checkpoint(plan_id: str, task_id: str, steps: List[PlannedStep]) -> TaskCheckpoint:
+    """Create (or restart) the checkpoint for a run of the given steps."""
+    prune_checkpoints()
+    now = time.time()
+    checkpoint = TaskCheckpoint(
+        plan_id=plan_id,
+        task_id=task_id,
+        steps=[StepCheckpoint(step=step) for step in steps],
+        created_at=now,
+        updated_at=now,
+    )
+    save_checkpoint(checkpoint)
+    return checkpoint
+
+
+def record_step(checkpoint: TaskCheckpoint, step_id: int, status: str,
+                output: str, error: Optional[str],
+                script_sha256: Optional[str] = None) -> None:
+    """Store a step's outcome and persist the checkpoint right away."""
+    for entry in checkpoint.steps:
+        if entry.step.id == step_id:
+            entry.status = status
+            entry.output = output
+            entry.error = error
+            entry.finished_at = time.time()
+            entry.script_sha256 = script_sha256 or entry.script_sha256
+            break
+    save_checkpoint(checkpoint)
+
+
+def replace_step_command(entry: StepCheckpoint, command: str) -> None:
+    """
+    Swap in a user-edited command; it gets the same analysis as a
+    freshly planned step and the step is reset to pending.
+    """
+    old = entry.step
+    entry.step = analyze_step(old.id, old.description, command, old.risk, old.source_step_ids)
+    entry.status = "pending"
+    entry.output = ""
+    entry.error = None
+    entry.finished_at = None
+    entry.script_sha256 = None
+
+
+def prune_checkpoints(max_age: Optional[float] = None) -> int:
+    """
+    Delete checkpoints not updated within max_age seconds.
+
+    Returns:
+        Number of checkpoints removed
+    """
+    max_age = CHECKPOINT_TTL_SECONDS if max_age is None else max_age
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return 0
+
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(CHECKPOINT_DIR):
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def pinned_scripts() -> Set[str]:
+    """
+    Installer script hashes that checkpoints younger than LUNA_CHECKPOINT_TTL
+    will re-run on resume.
+    """
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return set()
+
+    cutoff = time.time() - CHECKPOINT_TTL_SECONDS
+    pinned = set()
+    for name in os.listdir(CHECKPOINT_DIR):
+        path = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if not name.endswith(".json") or os.path.getmtime(path) < cutoff:
+                continue
+            with open(path) as f:
+                steps = json.load(f)["steps"]
+            pinned.update(entry["script_sha256"] for entry in steps if entry.get("script_sha256"))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # an unreadable checkpoint can't be resumed either
+            continue
+    return pinned
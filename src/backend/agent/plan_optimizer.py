@@ -0,0 +1,174 @@
+"""
+plan optimizer - cheap rewrites between planning and execution
+
+Provides:
+- Coalescing of adjacent same-manager installs into one invocation
+  (brew install a b c, apt-get install -y a b, npm install -g a b, pip install a b)
+- Removal of `which X` / `command -v X` probes already answered, either by
+  an earlier probe in the same plan or by cached toolchain state
+- A record of every rewrite so the ui can show what changed
+
+Only plain package names and known no-argument flags are merged; anything
+with shell syntax is left alone. Cached state is only trusted before the
+first state-changing step of the plan.
+"""
+
+import re
+import shlex
+from typing import Dict, List, Optional, Tuple
+
+from utils.executor import get_cached_tool_state, get_risk_level
+
+# manager command prefix -> flags that take no argument and are safe to share
+_INSTALL_MANAGERS: Dict[Tuple[str, ...], set] = {
+    ("brew", "install"): {"--cask", "--formula", "-q", "--quiet", "--no-quarantine"},
+    ("apt-get", "install"): {"-y", "--yes", "-q", "-qq", "--no-install-recommends"},
+    ("apt", "install"): {"-y", "--yes", "-q", "-qq", "--no-install-recommends"},
+    ("npm", "install"): {"-g", "--global"},
+    ("npm", "i"): {"-g", "--global"},
+    ("pip", "install"): {"-q", "--quiet", "--user", "-U", "--upgrade"},
+    ("pip3", "install"): {"-q", "--quiet", "--user", "-U", "--upgrade"},
+}
+
+_SHELL_SYNTAX = re.compile(r"""[;&|<>$`()\\"'*?{}\[\]~]""")
+_PACKAGE_NAME = re.compile(r"^[A-Za-z0-9@][A-Za-z0-9@._+/:=-]*$")
+_PROBE = re.compile(r"^(?:which|where|command -v)\s+([A-Za-z0-9._+-]+)$")
+
+_RISK_ORDER = {"safe": 0, "moderate": 1, "dangerous": 2}
+
+InstallKey = Tuple[bool, Tuple[str, ...], frozenset]
+
+
+def parse_install(command: str) -> Optional[Tuple[InstallKey, List[str], List[str]]]:
+    """
+    Split a simple package install into (group key, flags, packages).
+
+    Returns None for anything that isn't safe to merge.
+    """
+    command = command.strip()
+    if not command or _SHELL_SYNTAX.search(command):
+        return None
+
+    tokens = shlex.split(command)
+    use_sudo = tokens[0] == "sudo"
+    if use_sudo:
+        tokens = tokens[1:]
+
+    prefix = tuple(tokens[:2])
+    allowed_flags = _INSTALL_MANAGERS.get(prefix)
+    if allowed_flags is None:
+        return None
+
+    flags, packages = [], []
+    for token in tokens[2:]:
+        if token.startswith("-"):
+            if token not in allowed_flags:
+                return None
+            flags.append(token)
+        elif _PACKAGE_NAME.match(token):
+            packages.append(token)
+        else:
+            return None
+
+    if not packages:
+        return None
+    return (use_sudo, prefix, frozenset(flags)), flags, packages
+
+
+def probe_tool(command: str) -> Optional[str]:
+    """Tool name if the command is a plain presence probe like `which brew`."""
+    match = _PROBE.match(command.strip())
+    return match.group(1) if match else None
+
+
+def _render_install(key: InstallKey, flags: List[str], packages: List[str]) -> str:
+    use_sudo, prefix, _ = key
+    tokens = (["sudo"] if use_sudo else []) + list(prefix) + flags + packages
+    return " ".join(shlex.quote(token) for token in tokens)
+
+
+def _max_risk(first: str, second: str) -> str:
+    return first if _RISK_ORDER.get(first, 1) >= _RISK_ORDER.get(second, 1) else second
+
+
+def optimize_plan(steps: List) -> Tuple[List, List[dict]]:
+    """
+    Rewrite a plan's steps.
+
+    Args:
+        steps: ExecuteStep models in plan order
+
+    Returns:
+        Tuple of (optimized steps, rewrites). Merged steps keep the id of
+        their first source step and list every original id in
+        source_step_ids; dropped steps only appear in the rewrites.
+    """
+    optimized: List = []
+    rewrites: List[dict] = []
+    # tools confirmed present by a probe in this plan since the last state change
+    confirmed: set = set()
+    mutated = False
+    # index in `optimized` of the last install step -> (key, flags, packages)
+    last_install: Optional[Tuple[int, InstallKey, List[str], List[str]]] = None
+
+    for step in steps:
+        tool = probe_tool(step.command)
+        if tool is not None:
+            if tool in confirmed:
+                rewrites.append({
+                    "kind": "drop_probe",
+                    "step_ids": [step.id],
+                    "detail": f"`{step.command}` already answered by an earlier step",
+                })
+                continue
+            if not mutated and get_cached_tool_state(tool) is True:
+                confirmed.add(tool)
+                rewrites.append({
+                    "kind": "drop_probe",
+                    "step_ids": [step.id],
+                    "detail": f"{tool} is known to be installed (cached toolchain state)",
+                })
+                continue
+            confirmed.add(tool)
+            optimized.append(step)
+            last_install = None
+            continue
+
+        install = parse_install(step.command)
+        if install is not None and last_install is not None and last_install[1] == install[0]:
+            index, key, flags, packages = last_install
+            merged_packages = packages + [p for p in install[2] if p not in packages]
+            previous = optimized[index]
+            source_ids = list(previous.source_step_ids or [previous.id]) + [step.id]
+            optimized[index] = previous.model_copy(update={
+                "command": _render_install(key, flags, merged_packages),
+                "description": f"{previous.description}; {step.description}",
+                "risk": _max_risk(previous.risk, step.risk),
+                "source_step_ids": source_ids,
+            })
+            last_install = (index, key, flags, merged_packages)
+            mutated = True
+            confirmed.clear()
+            continue
+
+        optimized.append(step)
+        if install is not None:
+            last_install = (len(optimized) - 1, install[0], install[1], install[2])
+        else:
+            last_install = None
+
+        if get_risk_level(step.command) != "safe":
+            # anything that may change the system invalidates what probes told us
+            mutated = True
+            confirmed.clear()
+
+    for step in optimized:
+        if step.source_step_ids and len(step.source_step_ids) > 1:
+            manager = " ".join(parse_install(step.command)[0][1])
+            rewrites.append({
+                "kind": "merge_installs",
+                "step_ids": step.source_step_ids,
+                "detail": f"{len(step.source_step_ids)} `{manager}` steps merged into step {step.id}",
+            })
+
+    return optimized, rewrites
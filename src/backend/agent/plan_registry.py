@@ -0,0 +1,245 @@
+"""
+plan registry - server-side record of the plans luna produced
+
+Provides:
+- Unique plan IDs with a time-to-live for every plan returned by /api/execute
+- Per-step analysis done once at plan time (safety verdict, risk level,
+  sudo requirement, execution environment)
+- Tamper detection so a run only executes commands the backend planned
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from utils.executor import (
+    validate_command_safety,
+    get_risk_level,
+    needs_sudo,
+    get_execution_env,
+)
+
+# how long a plan stays runnable after it was produced
+PLAN_TTL_SECONDS: int = int(os.getenv("LUNA_PLAN_TTL", "1800"))
+# upper bound on stored plans; the oldest plan is evicted first
+MAX_STORED_PLANS: int = 256
+
+_RISK_ORDER = {"safe": 0, "moderate": 1, "dangerous": 2}
+
+
+class PlanError(Exception):
+    """Base error for plan lookups."""
+
+
+class PlanNotFoundError(PlanError):
+    """Plan ID is unknown or the plan has expired."""
+
+
+class PlanTamperedError(PlanError):
+    """A command no longer matches the one recorded at plan time."""
+
+
+@dataclass
+class PlannedStep:
+    """A plan step together with its precomputed analysis."""
+    id: int
+    description: str
+    command: str
+    risk: str
+    command_hash: str
+    is_safe: bool
+    block_reason: Optional[str]
+    needs_sudo: bool
+    env_overrides: Dict[str, str] = field(default_factory=dict)
+    source_step_ids: Optional[List[int]] = None
+
+    def build_env(self) -> dict:
+        """Rebuild the execution environment from the recorded overrides."""
+        env = os.environ.copy()
+        env.update(self.env_overrides)
+        return env
+
+
+@dataclass
+class StoredPlan:
+    plan_id: str
+    task_id: str
+    steps: List[PlannedStep]
+    created_at: float
+    expires_at: float
+    # the natural-language request and what planned it (llm, template, builtin)
+    request: Optional[str] = None
+    source: str = "builtin"
+    estimated_time: Optional[str] = None
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) >= self.expires_at
+
+
+_plans: Dict[str, StoredPlan] = {}
+_lock = threading.Lock()
+
+
+def hash_command(command: str) -> str:
+    """Stable fingerprint of a command string."""
+    return hashlib.sha256(command.encode("utf-8")).hexdigest()
+
+
+def _max_risk(first: str, second: str) -> str:
+    return first if _RISK_ORDER.get(first, 1) >= _RISK_ORDER.get(second, 1) else second
+
+
+def _env_overrides(command: str) -> Dict[str, str]:
+    """
+    Keep only the variables get_execution_env adds or changes, so a stored
+    plan does not snapshot the whole process environment.
+    """
+    base = os.environ
+    env = get_execution_env(command)
+    return {key: value for key, value in env.items() if base.get(key) != value}
+
+
+def analyze_step(
+    step_id: int,
+    description: str,
+    command: str,
+    risk: str,
+    source_step_ids: Optional[List[int]] = None,
+) -> PlannedStep:
+    """
+    Run every per-command check once and record the verdicts.
+
+    The stored risk is the stricter of the planner's label and
+    get_risk_level, so an optimistic llm label can't downgrade a step.
+    """
+    is_safe, reason = validate_command_safety(command)
+    return PlannedStep(
+        id=step_id,
+        description=description,
+        command=command,
+        risk=_max_risk(risk, get_risk_level(command)),
+        command_hash=hash_command(command),
+        is_safe=is_safe,
+        block_reason=reason,
+        needs_sudo=needs_sudo(command),
+        env_overrides=_env_overrides(command) if is_safe else {},
+        source_step_ids=source_step_ids,
+    )
+
+
+def _purge_expired(now: float) -> None:
+    expired = [plan_id for plan_id, plan in _plans.items() if plan.is_expired(now)]
+    for plan_id in expired:
+        del _plans[plan_id]
+
+
+def register_plan(task_id: str, steps: Iterable, request: Optional[str] = None,
+                  source: str = "builtin", estimated_time: Optional[str] = None) -> StoredPlan:
+    """
+    Analyze and store a freshly produced plan.
+
+    Args:
+        task_id: Task identifier returned to the client
+        steps: Objects exposing id, description, command, risk and
+            optionally source_step_ids
+        request: Natural-language request the plan answers
+        source: What produced the plan (llm, template or builtin)
+        estimated_time: Planner's estimate, kept for templates built from it
+
+    Returns:
+        The stored plan, including its new plan_id
+    """
+    planned = [
+        analyze_step(
+            step.id,
+            step.description,
+            step.command,
+            step.risk,
+            getattr(step, "source_step_ids", None),
+        )
+        for step in steps
+    ]
+    now = time.time()
+    plan = StoredPlan(
+        plan_id=uuid.uuid4().hex,
+        task_id=task_id,
+        steps=planned,
+        created_at=now,
+        expires_at=now + PLAN_TTL_SECONDS,
+        request=request,
+        source=source,
+        estimated_time=estimated_time,
+    )
+
+    with _lock:
+        _purge_expired(now)
+        while len(_plans) >= MAX_STORED_PLANS:
+            oldest = min(_plans.values(), key=lambda p: p.created_at)
+            del _plans[oldest.plan_id]
+        _plans[plan.plan_id] = plan
+
+    return plan
+
+
+def get_plan(plan_id: str) -> StoredPlan:
+    """
+    Look up a live plan.
+
+    Raises:
+        PlanNotFoundError: if the plan is unknown or expired
+    """
+    with _lock:
+        plan = _plans.get(plan_id)
+        if plan is None:
+            raise PlanNotFoundError(f"plan not found: {plan_id}")
+        if plan.is_expired():
+            del _plans[plan_id]
+            raise PlanNotFoundError(f"plan expired: {plan_id}")
+        return plan
+
+
+def select_steps(
+    plan: StoredPlan,
+    step_ids: Optional[List[int]] = None,
+    submitted_commands: Optional[Dict[int, str]] = None,
+) -> List[PlannedStep]:
+    """
+    Pick the steps to run and verify the commands the client sent back
+    match the planned ones.
+
+    Args:
+        plan: Plan returned by get_plan
+        step_ids: Optional subset of step IDs; plan order is preserved
+        submitted_commands: Commands the client sent back, keyed by step ID
+
+    Raises:
+        PlanError: if a requested step ID is not part of the plan
+        PlanTamperedError: if a submitted command differs from the planned one
+    """
+    by_id = {step.id: step for step in plan.steps}
+
+    if step_ids is not None:
+        unknown = [step_id for step_id in step_ids if step_id not in by_id]
+        if unknown:
+            raise PlanError(f"unknown step ids for plan {plan.plan_id}: {unknown}")
+        wanted = set(step_ids)
+        selected = [step for step in plan.steps if step.id in wanted]
+    else:
+        selected = list(plan.steps)
+
+    for step_id, command in (submitted_commands or {}).items():
+        step = by_id.get(step_id)
+        if step is None or hash_command(command) != step.command_hash:
+            raise PlanTamperedError(f"step {step_id} does not match the planned command")
+
+    return selected
+
+
+def clear_plans() -> None:
+    """Drop every stored plan."""
+    with _lock:
+        _plans.clear()
@@ -0,0 +1,118 @@
+"""
+prompt builder - planner prompts with a byte-stable, cacheable prefix
+
+Provides:
+- The static planner instructions as one constant, never interpolated, so
+  providers can reuse their prefix cache across requests
+- Dynamic context (os, package managers, client context) appended after
+  the static prefix and trimmed to a token budget
+- A cheap token estimate that needs no tokenizer dependency
+"""
+
+import os
+from typing import Dict, List, Optional
+
+# rough chars-per-token ratio for english text and shell commands
+CHARS_PER_TOKEN: int = 4
+CONTEXT_TOKEN_BUDGET: int = int(os.getenv("LUNA_PROMPT_CONTEXT_TOKENS", "200"))
+
+# must stay byte-identical between requests; dynamic values go in the context message
+STATIC_SYSTEM_PROMPT = """you are luna, an AI agent that generates shell commands for development workflows.
+
+ENVIRONMENT:
+- sudo is handled automatically via native dialog (no terminal prompts)
+- all commands run non-interactively (no user input required during execution)
+- the os and available package managers are given in the CONTEXT message that follows
+
+TASK: convert the user request into executable shell commands.
+
+RULES:
+1. generate atomic, directly-executable shell commands
+2. risk levels: "safe" (read-only), "moderate" (installs), "dangerous" (sudo/delete)
+3. add verification steps when useful (e.g., check if installed after install)
+4. use the appropriate package manager for the os
+
+COMMAND SYNTAX - CRITICAL:
+✓ CORRECT: curl -fsSL https://example.com/install.sh | bash
+✗ WRONG: /bin/bash -c '$(curl -fsSL https://example.com/install.sh)'
+✗ WRONG: $(curl ...) or backtick command substitution
+
+✓ CORRECT: brew install package
+✓ CORRECT: which brew
+✓ CORRECT: sudo apt-get install -y package
+
+ALWAYS use -y or equivalent for package installs (non-interactive).
+NEVER use interactive flags like -i, --interactive, or expect user input.
+pipe to bash directly for install scripts: curl url | bash
+
+respond with JSON only:
+{
+  "task_id": "unique_id",
+  "steps": [
+    {"id": 1, "description": "what this does", "command": "shell command", "risk": "safe|moderate|dangerous"}
+  ],
+  "requires_confirmation": true,
+  "estimated_time": "time estimate"
+}"""
+
+# client context keys worth spending tokens on, most useful first
+_CLIENT_CONTEXT_KEYS = ("project_type", "current_dir")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count; good enough for budgeting."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max(0, max_chars - 3)] + "..."
+
+
+def build_context_lines(
+    os_type: str,
+    package_managers: List[str],
+    client_context: Optional[Dict] = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> List[str]:
+    """
+    Context lines in priority order, trimmed to the token budget.
+
+    The os and package managers always fit; client-supplied context is
+    added while budget remains and long values are truncated.
+    """
+    lines = [
+        f"- os: {os_type}",
+        f"- package managers: {', '.join(package_managers) if package_managers else 'none detected'}",
+    ]
+    remaining = token_budget - sum(estimate_tokens(line) for line in lines)
+
+    for key in _CLIENT_CONTEXT_KEYS:
+        value = (client_context or {}).get(key)
+        if not value or remaining <= 0:
+            continue
+        line = _truncate(f"- client {key}: {value}", min(remaining, 60))
+        remaining -= estimate_tokens(line)
+        lines.append(line)
+
+    return lines
+
+
+def build_messages(
+    command: str,
+    os_type: str,
+    package_managers: List[str],
+    client_context: Optional[Dict] = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> List[dict]:
+    """
+    Chat messages for the planner: static prefix, then context, then the request.
+    """
+    context = "CONTEXT:\n" + "\n".join(
+        build_context_lines(os_type, package_managers, client_context, token_budget)
+    )
+    return [
+        {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+        {"role": "system", "content": context},
+        {"role": "user", "content": command},
+    ]
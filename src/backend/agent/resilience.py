@@ -0,0 +1,364 @@
+"""
+llm resilience - keep planning fast when a provider is slow or down
+
+Provides:
+- Per-request latency budget; when it runs out the caller falls back to
+  the hardcoded parser instead of waiting out sdk timeouts and retries
+- A circuit breaker per provider that trips after consecutive failures
+  and probes for recovery in the background
+- Optional hedging: a second provider (e.g. a local ollama endpoint) is
+  fired when the first has not answered after its p95 latency
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+
+# how often to look again while the latest call waits for a pool worker
+_QUEUED_POLL_S: float = 0.05
+
+
+class PlannerUnavailable(Exception):
+    """No provider produced a completion within the budget."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    - calls allowed
+    open      - calls rejected; a background probe checks for recovery
+    half_open - one trial call allowed (only used when there is no probe)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        cooldown_s: float = 30.0,
+        max_cooldown_s: float = 300.0,
+        probe: Optional[Callable[[], bool]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.max_cooldown_s = max_cooldown_s
+        self.probe = probe
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._probe_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and self.probe is None:
+                if time.monotonic() - self._opened_at >= self.cooldown_s:
+                    return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a real call may go to this provider right now."""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self.probe is not None:
+                return False
+            # no background probe: let a single trial call through after cooldown
+            if time.monotonic() - self._opened_at >= self.cooldown_s and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != "closed":
+                print(f"   🔌 {self.name}: circuit closed")
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """A reserved half-open trial call was cancelled before it went out."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == "open":
+                # failed half-open trial: restart the cooldown
+                self._opened_at = time.monotonic()
+                return
+            if self._failures < self.failure_threshold:
+                return
+            self._state = "open"
+            self._opened_at = time.monotonic()
+            print(f"   🔌 {self.name}: circuit open after {self._failures} failures")
+            if self.probe is not None and (self._probe_thread is None or not self._probe_thread.is_alive()):
+                self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+                self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        delay = self.cooldown_s
+        while True:
+            time.sleep(delay)
+            with self._lock:
+                if self._state != "open":
+                    return
+            try:
+                healthy = self.probe()
+            except Exception:
+                healthy = False
+            if healthy:
+                self.record_success()
+                return
+            delay = min(delay * 2, self.max_cooldown_s)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 100):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency_s: float) -> None:
+        with self._lock:
+            self._samples.append(latency_s)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class LLMProvider:
+    """
+    An openai-compatible chat completions endpoint.
+
+    Ollama exposes the same api under /v1, so a local model can be used
+    as a hedge through the same client.
+    """
+    name: str
+    client: object  # openai.OpenAI
+    model: str
+    breaker: CircuitBreaker
+    latency: LatencyTracker
+    # the provider's own timeout; only this (not a caller's budget) counts as a failure
+    timeout_s: float = 30.0
+    # request a server-sent event stream and assemble it into one completion
+    stream: bool = False
+
+    def complete(self, messages: List[dict], **kwargs):
+        # no sdk retries: the planner's budget and breaker decide what happens next
+        client = self.client.with_options(timeout=self.timeout_s, max_retries=0)
+        if not self.stream:
+            return client.chat.completions.create(model=self.model, messages=messages, **kwargs)
+        chunks = client.chat.completions.create(
+            model=self.model, messages=messages, stream=True,
+            stream_options={"include_usage": True}, **kwargs
+        )
+        return _collect_stream(chunks)
+
+    def probe(self) -> bool:
+        self.client.with_options(timeout=5.0, max_retries=0).models.list()
+        return True
+
+
+def _collect_stream(chunks) -> SimpleNamespace:
+    """
+    Fold streamed chunks into the shape of a non-streamed completion
+    (choices[0].message.content, finish_reason, usage).
+    """
+    content: List[str] = []
+    finish_reason = None
+    usage = None
+    for chunk in chunks:
+        if chunk.usage is not None:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta and choice.delta.content:
+                content.append(choice.delta.content)
+            finish_reason = choice.finish_reason or finish_reason
+    message = SimpleNamespace(role="assistant", content="".join(content))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=usage)
+
+
+class _Attempt:
+    """
+    One provider call; settles exactly once when the call itself finishes
+    (success, error, or the provider's own timeout). A call the planner
+    stops waiting for keeps running and still settles on its own; one that
+    never left the pool's queue is cancelled and does not settle.
+    """
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        # set when a pool worker actually starts the call, not at submit time
+        self.started: Optional[float] = None
+        self.future: Optional[Future] = None
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def settle(self, success: bool) -> None:
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        if success:
+            self.provider.latency.add(time.monotonic() - self.started)
+            self.provider.breaker.record_success()
+        else:
+            self.provider.breaker.record_failure()
+
+    def run(self, messages: List[dict], kwargs: dict):
+        self.started = time.monotonic()
+        return self.provider.complete(messages, **kwargs)
+
+    def on_done(self, future: Future) -> None:
+        try:
+            error = future.exception()
+        except CancelledError:
+            # never sent: says nothing about the provider's health
+            self.provider.breaker.release_trial()
+            return
+        self.settle(error is None)
+
+
+class ResilientPlanner:
+    """
+    Deadline-aware completion across one or more providers.
+
+    Providers are tried in order; with hedging enabled the next one is
+    fired once the current one has been quiet for its p95 latency (or
+    immediately when it fails).
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        budget_s: float = 8.0,
+        hedge: bool = True,
+        default_hedge_delay_s: float = 2.0,
+        min_samples: int = 5,
+        max_workers: int = 16,
+    ):
+        self.providers = providers
+        self.budget_s = budget_s
+        self.hedge = hedge
+        self.default_hedge_delay_s = default_hedge_delay_s
+        self.min_samples = min_samples
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="luna-llm")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.providers)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            provider.name: {
+                "circuit": provider.breaker.state,
+                "p95_ms": round(p95 * 1000) if (p95 := provider.latency.percentile(95)) else None,
+            }
+            for provider in self.providers
+        }
+
+    def _hedge_delay(self, provider: LLMProvider) -> float:
+        if len(provider.latency) < self.min_samples:
+            return self.default_hedge_delay_s
+        return provider.latency.percentile(95)
+
+    def _start(self, provider: LLMProvider, messages: List[dict], kwargs: dict) -> _Attempt:
+        attempt = _Attempt(provider)
+        attempt.future = self._pool.submit(attempt.run, messages, kwargs)
+        attempt.future.add_done_callback(attempt.on_done)
+        return attempt
+
+    def complete(self, messages: List[dict], budget_s: Optional[float] = None, **kwargs) -> Tuple[object, str]:
+        """
+        Get a chat completion within the latency budget.
+
+        Returns:
+            Tuple of (completion, provider name)
+
+        Raises:
+            PlannerUnavailable: if every circuit is open, every provider
+                failed, or the budget ran out
+        """
+        budget_s = budget_s if budget_s is not None else self.budget_s
+        deadline = time.monotonic() + budget_s
+        queue = list(self.providers)
+        attempts: List[_Attempt] = []
+
+        def launch_next() -> bool:
+            # breakers are consulted at launch time so a half-open trial
+            # is only reserved when the call actually goes out
+            while queue:
+                provider = queue.pop(0)
+                if provider.breaker.allow():
+                    attempts.append(self._start(provider, messages, kwargs))
+                    return True
+            return False
+
+        if not launch_next():
+            raise PlannerUnavailable("all llm providers unavailable (circuit open)")
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            pending = [a.future for a in attempts if not a.future.done()]
+            if not pending:
+                # everything launched so far failed: move on or give up
+                if not launch_next():
+                    break
+                continue
+
+            hedge_at = None
+            if self.hedge and queue:
+                latest = attempts[-1]
+                if latest.started is None:
+                    # still queued behind other calls: its hedge clock has not started
+                    remaining = min(remaining, _QUEUED_POLL_S)
+                else:
+                    hedge_at = latest.started + self._hedge_delay(latest.provider)
+                    remaining = min(remaining, max(0.0, hedge_at - time.monotonic()))
+
+            wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for attempt in attempts:
+                if attempt.future.done() and attempt.future.exception() is None:
+                    # a queued hedge is no longer needed
+                    for other in attempts:
+                        other.future.cancel()
+                    return attempt.future.result(), attempt.provider.name
+
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                if any(not a.future.done() for a in attempts):
+                    print(f"   🪁 hedging with {queue[0].name}")
+                launch_next()
+
+        errors = []
+        for attempt in attempts:
+            if attempt.future.cancel():
+                # still queued behind other calls: the caller has given up, so never send it
+                errors.append(f"{attempt.provider.name}: not started within {budget_s:.1f}s budget")
+            elif attempt.future.done():
+                errors.append(f"{attempt.provider.name}: {attempt.future.exception()}")
+            else:
+                # the caller's budget ran out, not the provider: the call
+                # settles (and feeds the breaker) only when it really finishes
+                errors.append(f"{attempt.provider.name}: exceeded {budget_s:.1f}s budget")
+
+        raise PlannerUnavailable("; ".join(errors) or "no llm response")
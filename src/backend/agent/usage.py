@@ -0,0 +1,141 @@
+"""
+llm usage accounting - token counts per planning request
+
+Provides:
+- A ring buffer of per-request prompt, completion and cached prompt tokens,
+  with latency and the provider that answered
+- Adaptive max_tokens: the p95 completion size of past plans for similar
+  requests, plus headroom, instead of one fixed cap
+- Totals and cache hit ratio for GET /api/usage
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+USAGE_WINDOW: int = int(os.getenv("LUNA_USAGE_WINDOW", "500"))
+MIN_MAX_TOKENS: int = 256
+MAX_MAX_TOKENS: int = int(os.getenv("LUNA_MAX_COMPLETION_TOKENS", "1500"))
+# cap used until a kind of request has enough history
+DEFAULT_MAX_TOKENS: int = 1000
+MIN_SAMPLES: int = 5
+HEADROOM: float = 1.25
+
+_CLAUSE_SPLIT = re.compile(r"\b(?:and|then)\b|[,;&]+", re.IGNORECASE)
+
+RequestKind = Tuple[str, int]
+
+
+def request_kind(command: str) -> RequestKind:
+    """
+    Bucket a request by its first verb and number of clauses;
+    "install node and docker" plans are about twice "install node".
+    """
+    words = command.lower().split()
+    verb = words[0] if words else ""
+    clauses = [part for part in _CLAUSE_SPLIT.split(command) if part.strip()]
+    return verb, min(max(1, len(clauses)), 4)
+
+
+@dataclass
+class UsageRecord:
+    at: float
+    provider: str
+    kind: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    max_tokens: int
+    latency_ms: float
+    truncated: bool
+
+
+def _cached_tokens(usage) -> int:
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return int(details.get("cached_tokens") or 0)
+    return int(getattr(details, "cached_tokens", 0) or 0)
+
+
+class UsageTracker:
+    """Thread-safe record of recent completions and their token usage."""
+
+    def __init__(self, window: int = USAGE_WINDOW):
+        self._records: Deque[UsageRecord] = deque(maxlen=window)
+        self._completions: Dict[RequestKind, Deque[int]] = {}
+        self._lock = threading.Lock()
+
+    def suggest_max_tokens(self, command: str) -> int:
+        """
+        max_tokens for a request: p95 completion size of its kind plus
+        headroom, clamped to [MIN_MAX_TOKENS, MAX_MAX_TOKENS].
+        """
+        with self._lock:
+            samples = sorted(self._completions.get(request_kind(command), ()))
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_MAX_TOKENS
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return max(MIN_MAX_TOKENS, min(MAX_MAX_TOKENS, int(p95 * HEADROOM) + 32))
+
+    def record(self, command: str, provider: str, completion, max_tokens: int, latency_s: float) -> Optional[UsageRecord]:
+        """
+        Store the usage of one completion.
+
+        A plan cut off by max_tokens is recorded at the ceiling so the next
+        similar request gets the full allowance.
+        """
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return None
+        truncated = any(
+            getattr(choice, "finish_reason", None) == "length"
+            for choice in getattr(completion, "choices", None) or []
+        )
+        kind = request_kind(command)
+        record = UsageRecord(
+            at=time.time(),
+            provider=provider,
+            kind=f"{kind[0]}/{kind[1]}",
+            prompt_tokens=int(getattr(usage, "prompt_tokens", 0) or 0),
+            completion_tokens=int(getattr(usage, "completion_tokens", 0) or 0),
+            cached_tokens=_cached_tokens(usage),
+            max_tokens=max_tokens,
+            latency_ms=round(latency_s * 1000, 1),
+            truncated=truncated,
+        )
+        with self._lock:
+            self._records.append(record)
+            samples = self._completions.setdefault(kind, deque(maxlen=50))
+            samples.append(MAX_MAX_TOKENS if truncated else record.completion_tokens)
+        if truncated:
+            print(f"   ✂️  plan hit max_tokens={max_tokens}; raising the cap for '{record.kind}' requests")
+        return record
+
+    def summary(self, recent: int = 20) -> dict:
+        with self._lock:
+            records = list(self._records)
+        prompt = sum(r.prompt_tokens for r in records)
+        cached = sum(r.cached_tokens for r in records)
+        return {
+            "requests": len(records),
+            "prompt_tokens": prompt,
+            "completion_tokens": sum(r.completion_tokens for r in records),
+            "cached_tokens": cached,
+            "cache_hit_ratio": round(cached / prompt, 3) if prompt else 0.0,
+            "truncated": sum(1 for r in records if r.truncated),
+            "recent": [asdict(r) for r in records[-recent:]],
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._completions.clear()
+
+
+tracker = UsageTracker()
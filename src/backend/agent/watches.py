@@ -0,0 +1,321 @@
+"""
+watch mode - recurring read-only status checks with change-only updates
+
+Provides:
+- Turning a safe-only plan into a recurring job on one shared scheduler thread
+- Jittered scheduling, and coalescing so identical commands from watches
+  that are due together run once per batch
+- Per-step output hashing; subscribers only receive diffs when a step changes
+- Automatic backoff for watches whose output stops changing, expiry for
+  watches nobody is listening to, and a cap on the number of watches
+"""
+
+import difflib
+import hashlib
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agent.plan_registry import PlannedStep
+from utils.executor import execute_command, has_shell_control
+
+MAX_WATCHES: int = int(os.getenv("LUNA_MAX_WATCHES", "16"))
+MIN_INTERVAL_SECONDS: float = 5.0
+DEFAULT_INTERVAL_SECONDS: float = float(os.getenv("LUNA_WATCH_INTERVAL", "30"))
+# watches with no subscriber for this long are dropped
+WATCH_IDLE_TTL_SECONDS: float = float(os.getenv("LUNA_WATCH_IDLE_TTL", "300"))
+# unchanged runs before the interval doubles, and the largest multiplier
+BACKOFF_AFTER_RUNS: int = 3
+MAX_BACKOFF: int = 8
+# fraction of the interval added as random delay to each run
+JITTER_FRACTION: float = 0.1
+# watches due within this window of each other run in the same batch
+COALESCE_WINDOW_SECONDS: float = 1.0
+
+StepRunner = Callable[[PlannedStep], Tuple[bool, str, str]]
+Subscriber = Callable[[dict], None]
+
+
+class WatchError(Exception):
+    """Base error for watch operations."""
+
+
+class WatchNotFoundError(WatchError):
+    """Watch ID is unknown or the watch expired."""
+
+
+class WatchLimitError(WatchError):
+    """Too many active watches."""
+
+
+def run_watch_step(step: PlannedStep) -> Tuple[bool, str, str]:
+    """Execute a watched step with the analysis recorded at plan time."""
+    return execute_command(
+        step.command,
+        timeout=60,
+        require_sudo=False,
+        env=step.build_env(),
+        prevalidated=True
+    )
+
+
+def _hash_output(success: bool, stdout: str, stderr: str) -> str:
+    digest = hashlib.sha256()
+    for part in (str(success), stdout, stderr):
+        digest.update(part.encode("utf-8", "replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class StepState:
+    status: str = "pending"
+    output: str = ""
+    error: Optional[str] = None
+    output_hash: Optional[str] = None
+
+
+@dataclass
+class Watch:
+    watch_id: str
+    plan_id: str
+    steps: List[PlannedStep]
+    interval_s: float
+    next_run: float
+    created_at: float
+    last_subscribed_at: float
+    runs: int = 0
+    idle_runs: int = 0
+    state: Dict[int, StepState] = field(default_factory=dict)
+    subscribers: List[Subscriber] = field(default_factory=list)
+
+    @property
+    def backoff(self) -> int:
+        return min(MAX_BACKOFF, 2 ** (self.idle_runs // BACKOFF_AFTER_RUNS))
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "watch_id": self.watch_id,
+            "runs": self.runs,
+            "interval_s": self.interval_s * self.backoff,
+            "steps": [
+                {
+                    "step_id": step.id,
+                    "command": step.command,
+                    "status": self.state[step.id].status,
+                    "output": self.state[step.id].output,
+                    "error": self.state[step.id].error,
+                    "hash": self.state[step.id].output_hash,
+                }
+                for step in self.steps
+            ],
+        }
+
+    def describe(self) -> dict:
+        return {
+            "watch_id": self.watch_id,
+            "plan_id": self.plan_id,
+            "interval_s": self.interval_s,
+            "effective_interval_s": self.interval_s * self.backoff,
+            "runs": self.runs,
+            "subscribers": len(self.subscribers),
+            "next_run_in_s": round(max(0.0, self.next_run - time.time()), 1),
+        }
+
+
+class WatchScheduler:
+    """
+    One thread drives every watch; step commands run on a small pool.
+    """
+
+    def __init__(self, runner: StepRunner = run_watch_step, max_workers: int = 4):
+        self.runner = runner
+        self._watches: Dict[str, Watch] = {}
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="luna-watch")
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def create(self, plan_id: str, steps: List[PlannedStep], interval_s: Optional[float] = None) -> Watch:
+        """
+        Register a watch for a plan's steps.
+
+        Raises:
+            WatchError: if any step is not a single safe, read-only command
+            WatchLimitError: if MAX_WATCHES watches already exist
+        """
+        # risk labels are pattern based; a chained or redirected command is never
+        # treated as read-only, whatever its label
+        unsafe = [
+            step.id for step in steps
+            if step.risk != "safe" or not step.is_safe or step.needs_sudo or has_shell_control(step.command)
+        ]
+        if unsafe:
+            raise WatchError(f"only read-only plans can be watched; steps {unsafe} are not safe")
+        if not steps:
+            raise WatchError("plan has no steps to watch")
+
+        now = time.time()
+        interval_s = max(MIN_INTERVAL_SECONDS, interval_s or DEFAULT_INTERVAL_SECONDS)
+        watch = Watch(
+            watch_id=uuid.uuid4().hex,
+            plan_id=plan_id,
+            steps=steps,
+            interval_s=interval_s,
+            # first run soon, but jittered so a burst of new watches spreads out
+            next_run=now + random.uniform(0, JITTER_FRACTION * interval_s),
+            created_at=now,
+            last_subscribed_at=now,
+            state={step.id: StepState() for step in steps},
+        )
+
+        with self._cond:
+            if len(self._watches) >= MAX_WATCHES:
+                raise WatchLimitError(f"watch limit reached ({MAX_WATCHES})")
+            self._watches[watch.watch_id] = watch
+            self._ensure_thread()
+            self._cond.notify()
+        return watch
+
+    def get(self, watch_id: str) -> Watch:
+        with self._cond:
+            watch = self._watches.get(watch_id)
+        if watch is None:
+            raise WatchNotFoundError(f"watch not found: {watch_id}")
+        return watch
+
+    def list(self) -> List[dict]:
+        with self._cond:
+            return [watch.describe() for watch in self._watches.values()]
+
+    def cancel(self, watch_id: str) -> None:
+        with self._cond:
+            if self._watches.pop(watch_id, None) is None:
+                raise WatchNotFoundError(f"watch not found: {watch_id}")
+
+    def subscribe(self, watch_id: str, callback: Subscriber) -> dict:
+        """
+        Add a subscriber and return the current snapshot for it.
+
+        A new subscriber also resets the backoff so it sees fresh data soon.
+        """
+        with self._cond:
+            watch = self._watches.get(watch_id)
+            if watch is None:
+                raise WatchNotFoundError(f"watch not found: {watch_id}")
+            watch.subscribers.append(callback)
+            watch.last_subscribed_at = time.time()
+            if watch.idle_runs:
+                watch.idle_runs = 0
+                watch.next_run = min(watch.next_run, time.time() + watch.interval_s)
+                self._cond.notify()
+            return watch.snapshot()
+
+    def unsubscribe(self, watch_id: str, callback: Subscriber) -> None:
+        with self._cond:
+            watch = self._watches.get(watch_id)
+            if watch and callback in watch.subscribers:
+                watch.subscribers.remove(callback)
+                watch.last_subscribed_at = time.time()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                now = time.time()
+                self._expire_idle(now)
+                if not self._watches:
+                    self._cond.wait()
+                    continue
+                earliest = min(watch.next_run for watch in self._watches.values())
+                if earliest > now:
+                    self._cond.wait(timeout=earliest - now)
+                    continue
+                due = [
+                    watch for watch in self._watches.values()
+                    if watch.next_run <= now + COALESCE_WINDOW_SECONDS
+                ]
+            self._run_batch(due)
+
+    def _expire_idle(self, now: float) -> None:
+        for watch_id, watch in list(self._watches.items()):
+            if not watch.subscribers and now - watch.last_subscribed_at > WATCH_IDLE_TTL_SECONDS:
+                print(f"   👀 watch {watch_id[:8]} expired (no subscribers)")
+                del self._watches[watch_id]
+
+    def _run_batch(self, due: List[Watch]) -> None:
+        # coalesce: each distinct command runs once for every watch in the batch
+        unique: Dict[str, PlannedStep] = {}
+        for watch in due:
+            for step in watch.steps:
+                unique.setdefault(step.command_hash, step)
+
+        futures = {key: self._pool.submit(self.runner, step) for key, step in unique.items()}
+        outcomes: Dict[str, Tuple[bool, str, str]] = {}
+        for key, future in futures.items():
+            try:
+                outcomes[key] = future.result()
+            except Exception as e:
+                outcomes[key] = (False, "", f"watch error: {e}")
+
+        for watch in due:
+            self._apply(watch, outcomes)
+
+    def _apply(self, watch: Watch, outcomes: Dict[str, Tuple[bool, str, str]]) -> None:
+        changes = []
+        with self._cond:
+            first_run = watch.runs == 0
+            for step in watch.steps:
+                success, stdout, stderr = outcomes[step.command_hash]
+                new_hash = _hash_output(success, stdout, stderr)
+                state = watch.state[step.id]
+                if new_hash == state.output_hash:
+                    continue
+
+                status = "completed" if success else "failed"
+                diff = list(difflib.unified_diff(
+                    state.output.splitlines(), stdout.splitlines(), lineterm="", n=0
+                ))[2:]  # drop the ---/+++ header
+                changes.append({
+                    "step_id": step.id,
+                    "status": status,
+                    "hash": new_hash,
+                    "diff": diff,
+                    "error": stderr if not success else None,
+                })
+                state.status = status
+                state.output = stdout
+                state.error = stderr if not success else None
+                state.output_hash = new_hash
+
+            watch.runs += 1
+            watch.idle_runs = 0 if changes else watch.idle_runs + 1
+            interval = watch.interval_s * watch.backoff
+            watch.next_run = time.time() + interval + random.uniform(0, JITTER_FRACTION * interval)
+            subscribers = list(watch.subscribers)
+            if not changes:
+                return
+            event = watch.snapshot() if first_run else {
+                "type": "change",
+                "watch_id": watch.watch_id,
+                "runs": watch.runs,
+                "steps": changes,
+            }
+
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"   ⚠️  watch subscriber failed: {e}")
+
+
+scheduler = WatchScheduler()
@@ -0,0 +1,340 @@
+"""
+fake openai server - local stand-in for the chat completions api
+
+Provides:
+- POST /v1/chat/completions returning a luna-shaped json plan
+- Configurable latency and jitter per request
+- Streaming (server-sent events) when the client asks for stream=true
+- Failure injection by probability and status code
+- Simulated prompt prefix caching: usage reports cached_tokens for the part
+  of a prompt that matches an earlier one, and only uncached tokens pay
+  the prefill latency
+- max_tokens enforcement (finish_reason "length")
+- Request counters for load-test reports
+
+Run standalone:
+    python -m bench.fake_openai --port 8787 --latency-ms 400
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://127.0.0.1:8787/v1 OPENAI_API_KEY=fake python main.py
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """Behaviour knobs for the fake server."""
+    latency_ms: float = 300.0
+    jitter_ms: float = 50.0
+    failure_rate: float = 0.0
+    failure_status: int = 500
+    stream_chunk_delay_ms: float = 5.0
+    step_count: int = 3
+    # stub command each planned step runs; sleep keeps runtime controllable
+    step_command: str = "sleep {seconds}"
+    step_seconds: float = 0.05
+    step_risk: str = "moderate"
+    # extra latency per 1k prompt tokens not served from the prefix cache
+    prefill_ms_per_1k_tokens: float = 0.0
+    # providers only cache prefixes past a minimum, in 128-token blocks
+    cache_min_tokens: int = 1024
+
+
+@dataclass
+class FakeOpenAIStats:
+    requests: int = 0
+    failures: int = 0
+    streamed: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, failed: bool, streamed: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += int(failed)
+            self.streamed += int(streamed)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "streamed": self.streamed,
+            }
+
+
+class PrefixCache:
+    """Remembers recent prompts and reports how much of a new one is cached."""
+
+    def __init__(self, capacity: int = 64, block_tokens: int = 128):
+        self.capacity = capacity
+        self.block_tokens = block_tokens
+        self._prompts: List[str] = []
+        self._lock = threading.Lock()
+
+    def lookup_and_store(self, prompt_text: str, min_tokens: int) -> int:
+        with self._lock:
+            longest = max((_common_prefix(prompt_text, seen) for seen in self._prompts), default=0)
+            self._prompts.append(prompt_text)
+            del self._prompts[:-self.capacity]
+        tokens = _rough_tokens(prompt_text[:longest]) if longest else 0
+        tokens -= tokens % self.block_tokens
+        return tokens if tokens >= min_tokens else 0
+
+
+def _common_prefix(a: str, b: str) -> int:
+    return len(os.path.commonprefix([a, b]))
+
+
+def build_plan_content(config: FakeOpenAIConfig, user_message: str) -> str:
+    """Json plan in the shape parse_command_with_llm expects."""
+    command = config.step_command.format(seconds=config.step_seconds)
+    steps = [
+        {
+            "id": index + 1,
+            "description": f"stub step {index + 1} for: {user_message[:40]}",
+            "command": command,
+            "risk": config.step_risk,
+        }
+        for index in range(config.step_count)
+    ]
+    return json.dumps({
+        "task_id": f"task_{uuid.uuid4().hex[:8]}",
+        "steps": steps,
+        "requires_confirmation": True,
+        "estimated_time": f"{config.step_seconds * config.step_count:.1f} seconds",
+    })
+
+
+def _rough_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _make_handler(config: FakeOpenAIConfig, stats: FakeOpenAIStats, cache: PrefixCache):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # keep load tests quiet
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+            elif self.path == "/stats":
+                self._send_json(200, stats.as_dict())
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "invalid json"}})
+                return
+
+            stream = bool(request.get("stream"))
+            messages = request.get("messages") or [{}]
+            prompt_text = "".join(str(m.get("content", "")) for m in messages)
+            prompt_tokens = _rough_tokens(prompt_text)
+            cached_tokens = cache.lookup_and_store(prompt_text, config.cache_min_tokens)
+
+            delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+            delay += config.prefill_ms_per_1k_tokens * (prompt_tokens - cached_tokens) / 1000
+            time.sleep(max(0.0, delay) / 1000)
+
+            if random.random() < config.failure_rate:
+                stats.record(failed=True, streamed=stream)
+                self._send_json(config.failure_status, {
+                    "error": {"message": "injected failure", "type": "server_error"}
+                })
+                return
+
+            user_message = str(messages[-1].get("content", ""))
+            content = build_plan_content(config, user_message)
+            finish_reason = "stop"
+            max_tokens = request.get("max_tokens")
+            if max_tokens and _rough_tokens(content) > max_tokens:
+                content = content[:max_tokens * 4]
+                finish_reason = "length"
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "gpt-4o-mini")
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": _rough_tokens(content),
+                "total_tokens": prompt_tokens + _rough_tokens(content),
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            }
+
+            stats.record(failed=False, streamed=stream)
+            if stream:
+                include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                self._stream(completion_id, model, content, finish_reason, usage if include_usage else None)
+            else:
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": finish_reason,
+                    }],
+                    "usage": usage,
+                })
+
+        def _stream(self, completion_id: str, model: str, content: str, finish_reason: str,
+                    usage: Optional[dict] = None) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send(delta: Optional[dict], finish: Optional[str], chunk_usage: Optional[dict] = None) -> None:
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}],
+                }
+                if chunk_usage is not None:
+                    chunk["usage"] = chunk_usage
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            send({"role": "assistant", "content": ""}, None)
+            for start in range(0, len(content), 32):
+                send({"content": content[start:start + 32]}, None)
+                time.sleep(config.stream_chunk_delay_ms / 1000)
+            send({}, finish_reason)
+            if usage is not None:
+                # stream_options.include_usage: a last chunk with no choices, as openai sends
+                send(None, None, usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return FakeOpenAIHandler
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients abandoning slow calls (deadlines, hedging) is expected here
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeOpenAIServer:
+    """
+    Threaded fake chat completions server.
+
+    Usage:
+        with FakeOpenAIServer(FakeOpenAIConfig(latency_ms=100)) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+    """
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeOpenAIConfig()
+        self.stats = FakeOpenAIStats()
+        self.cache = PrefixCache()
+        self._server = _QuietHTTPServer((host, port), _make_handler(self.config, self.stats, self.cache))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """Shared cli flags for the fake server (also used by the load tester)."""
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="llm response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="random +/- latency jitter")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability of an injected error")
+    parser.add_argument("--failure-status", type=int, default=500, help="http status for injected errors")
+    parser.add_argument("--stream-chunk-delay-ms", type=float, default=5.0, help="delay between streamed chunks")
+    parser.add_argument("--plan-steps", type=int, default=3, help="steps per generated plan")
+    parser.add_argument("--step-command", default="sleep {seconds}", help="stub command for each step")
+    parser.add_argument("--step-seconds", type=float, default=0.05, help="runtime of each stub step")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=0.0, help="latency per 1k uncached prompt tokens")
+    parser.add_argument("--cache-min-tokens", type=int, default=1024, help="smallest prefix the fake caches")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOpenAIConfig:
+    return FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        stream_chunk_delay_ms=args.stream_chunk_delay_ms,
+        step_count=args.plan_steps,
+        step_command=args.step_command,
+        step_seconds=args.step_seconds,
+        prefill_ms_per_1k_tokens=args.prefill_ms_per_1k,
+        cache_min_tokens=args.cache_min_tokens,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="local fake openai chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"🧪 fake openai listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+fake script server - local stand-in for remote installer scripts
+
+Provides:
+- GET /<name>.sh serving a configurable script body
+- ETag and Last-Modified headers, with 304 answers to conditional requests
+- A "down" switch that answers 503, to exercise offline reuse
+- Counters for full downloads and 304s
+
+Run standalone:
+    python -m bench.fake_script_server --port 8788
+
+Then plan a command such as:
+    curl -fsSL http://127.0.0.1:8788/install.sh | bash
+"""
+
+import argparse
+import hashlib
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_SCRIPT = "#!/bin/bash\necho 'luna fake installer ran'\n"
+
+
+class FakeScriptServer:
+    """
+    Threaded server for installer scripts.
+
+    Usage:
+        with FakeScriptServer() as server:
+            url = server.url("install.sh")
+            server.set_script("install.sh", "echo v2")
+            server.down = True
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.scripts: Dict[str, bytes] = {"install.sh": DEFAULT_SCRIPT.encode("utf-8")}
+        self.modified: Dict[str, str] = {"install.sh": formatdate(usegmt=True)}
+        self.down = False
+        self.counts = {"full": 0, "not_modified": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def url(self, name: str) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{name}"
+
+    def set_script(self, name: str, body: str) -> None:
+        with self._lock:
+            self.scripts[name] = body.encode("utf-8")
+            self.modified[name] = formatdate(usegmt=True)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class FakeScriptHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.lstrip("/")
+                if server.down:
+                    server._count("errors")
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                with server._lock:
+                    body = server.scripts.get(name)
+                    modified = server.modified.get(name)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    server._count("not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                server._count("full")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/x-shellscript")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return FakeScriptHandler
+
+    def start(self) -> "FakeScriptServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeScriptServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="local stand-in for remote installer scripts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--script", help="file whose contents are served as /install.sh")
+    args = parser.parse_args()
+
+    server = FakeScriptServer(host=args.host, port=args.port)
+    if args.script:
+        with open(args.script) as f:
+            server.set_script("install.sh", f.read())
+    print(f"🧪 fake script server: curl -fsSL {server.url('install.sh')} | bash")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
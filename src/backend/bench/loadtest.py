@@ -0,0 +1,341 @@
+"""
+load tester - end-to-end latency and throughput for the luna backend
+
+Provides:
+- Closed-loop (fixed concurrency) and open-loop (poisson arrival rate) load
+- Scenarios for GET /health, POST /api/execute and a full plan + run cycle
+- An optional self-contained setup: a local fake openai server plus a
+  spawned backend, so no real api calls are made; --stream makes that
+  backend plan over streamed completions
+- A json report with p50/p95/p99 latency, throughput and error rate
+
+Examples (from src/backend):
+    python -m bench.loadtest --spawn --concurrency 20 --duration 30
+    python -m bench.loadtest --spawn --rate 50 --mix plan=3,run=1,health=1
+    python -m bench.loadtest --spawn --stream --mix plan=1 --stream-chunk-delay-ms 20
+    python -m bench.loadtest --target http://127.0.0.1:8000 --mix health=1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.fake_openai import (
+    FakeOpenAIServer,
+    add_config_arguments,
+    config_from_args,
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("health", "plan", "run")
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    error_kinds: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, latency_ms: float, error: Optional[str]) -> None:
+        self.latencies_ms.append(latency_ms)
+        if error:
+            self.errors += 1
+            self.error_kinds[error] = self.error_kinds.get(error, 0) + 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(stats: EndpointStats, elapsed_s: float) -> dict:
+    values = sorted(stats.latencies_ms)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": stats.errors,
+        "error_rate": round(stats.errors / count, 4) if count else 0.0,
+        "error_kinds": stats.error_kinds,
+        "throughput_rps": round(count / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "latency_ms": {
+            "min": round(values[0], 2) if values else 0.0,
+            "mean": round(sum(values) / count, 2) if values else 0.0,
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+            "p99": round(percentile(values, 99), 2),
+            "max": round(values[-1], 2) if values else 0.0,
+        },
+    }
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse 'plan=3,run=1' into weighted scenarios."""
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario: {name} (expected one of {', '.join(SCENARIOS)})")
+        mix.append((name, float(weight) if weight else 1.0))
+    return mix
+
+
+class LoadTester:
+    """Drives the backend and collects per-endpoint latencies."""
+
+    def __init__(self, client: httpx.AsyncClient, mix: List[Tuple[str, float]], command: str):
+        self.client = client
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.command = command
+        self.stats: Dict[str, EndpointStats] = {}
+
+    def _record(self, endpoint: str, started: float, error: Optional[str]) -> None:
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats.setdefault(endpoint, EndpointStats()).record(latency_ms, error)
+
+    async def _call(self, endpoint: str, method: str, path: str,
+                    started: Optional[float] = None, **kwargs) -> Optional[dict]:
+        # started may be the scheduled arrival time, so queueing counts as latency
+        started = started if started is not None else time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.TimeoutException:
+            self._record(endpoint, started, "timeout")
+            return None
+        except httpx.HTTPError as e:
+            self._record(endpoint, started, type(e).__name__)
+            return None
+
+        if response.status_code >= 400:
+            self._record(endpoint, started, f"http_{response.status_code}")
+            return None
+
+        payload = response.json()
+        error = None
+        if endpoint == "POST /api/execute/run" and payload.get("overall_status") != "completed":
+            error = f"run_{payload.get('overall_status')}"
+        self._record(endpoint, started, error)
+        return payload
+
+    async def run_once(self, started: Optional[float] = None) -> None:
+        scenario = random.choices(self.names, weights=self.weights)[0]
+        if scenario == "health":
+            await self._call("GET /health", "GET", "/health", started)
+            return
+
+        plan = await self._call("POST /api/execute", "POST", "/api/execute", started,
+                                json={"command": self.command})
+        if scenario == "run" and plan and plan.get("plan_id"):
+            await self._call("POST /api/execute/run", "POST", "/api/execute/run",
+                             json={"plan_id": plan["plan_id"]})
+
+    async def closed_loop(self, concurrency: int, deadline: float, max_requests: Optional[int]) -> None:
+        issued = 0
+
+        async def worker() -> None:
+            nonlocal issued
+            while time.perf_counter() < deadline:
+                if max_requests is not None:
+                    if issued >= max_requests:
+                        return
+                    issued += 1
+                await self.run_once()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, concurrency: int, deadline: float,
+                        max_requests: Optional[int]) -> None:
+        in_flight = asyncio.Semaphore(concurrency)
+        tasks = []
+
+        async def arrival(scheduled: float) -> None:
+            async with in_flight:
+                await self.run_once(started=scheduled)
+
+        next_arrival = time.perf_counter()
+        while next_arrival < deadline and (max_requests is None or len(tasks) < max_requests):
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(arrival(next_arrival)))
+            next_arrival += random.expovariate(rate)
+
+        await asyncio.gather(*tasks)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_backend(openai_base_url: str, port: int, workers: int, state_dir: str,
+                  stream: bool = False) -> subprocess.Popen:
+    """Start the backend under uvicorn, pointed at the fake openai server.
+
+    All on-disk state goes to state_dir, and the plan index is off so every
+    plan request really reaches the (fake) llm instead of a stored template.
+    With stream, the backend requests streamed completions.
+    """
+    env = os.environ.copy()
+    env["OPENAI_BASE_URL"] = openai_base_url
+    env["OPENAI_API_KEY"] = "fake-load-test-key"
+    env["LUNA_PLAN_INDEX"] = "false"
+    env["LUNA_PLAN_INDEX_PATH"] = os.path.join(state_dir, "plan-index.json")
+    env["LUNA_CHECKPOINT_DIR"] = os.path.join(state_dir, "checkpoints")
+    env["LUNA_SCRIPT_CACHE_DIR"] = os.path.join(state_dir, "script-cache")
+    env["LUNA_LLM_STREAM"] = "true" if stream else "false"
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app",
+         "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for_health(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"backend at {base_url} did not become healthy within {timeout}s")
+
+
+async def run_load(args: argparse.Namespace, base_url: str) -> dict:
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        tester = LoadTester(client, mix, args.command)
+        started = time.perf_counter()
+        deadline = started + args.duration
+        if args.rate:
+            await tester.open_loop(args.rate, args.concurrency, deadline, args.requests)
+        else:
+            await tester.closed_loop(args.concurrency, deadline, args.requests)
+        elapsed = time.perf_counter() - started
+
+    all_stats = EndpointStats()
+    for stats in tester.stats.values():
+        all_stats.latencies_ms.extend(stats.latencies_ms)
+        all_stats.errors += stats.errors
+        for kind, count in stats.error_kinds.items():
+            all_stats.error_kinds[kind] = all_stats.error_kinds.get(kind, 0) + count
+
+    return {
+        "target": base_url,
+        "mode": "open" if args.rate else "closed",
+        "concurrency": args.concurrency,
+        "rate_rps": args.rate,
+        "mix": dict(mix),
+        "command": args.command,
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize(all_stats, elapsed),
+        "endpoints": {name: summarize(stats, elapsed) for name, stats in sorted(tester.stats.items())},
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="end-to-end load test for the luna backend")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--target", help="base url of a running backend")
+    target.add_argument("--spawn", action="store_true",
+                        help="start a fake openai server and a backend for this run")
+    parser.add_argument("--backend-workers", type=int, default=1,
+                        help="uvicorn workers when spawning (1 when the mix includes run)")
+    parser.add_argument("--stream", action="store_true",
+                        help="with --spawn: the backend requests streamed completions from the fake server")
+    parser.add_argument("--concurrency", type=int, default=10, help="workers, or max in-flight with --rate")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrivals per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="test length in seconds")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many scenarios")
+    parser.add_argument("--mix", default="plan=1,run=1,health=1", help="weighted scenarios, e.g. plan=3,run=1")
+    parser.add_argument("--command", default="set up a node project", help="command sent to /api/execute")
+    parser.add_argument("--request-timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write the json report here instead of stdout")
+    add_config_arguments(parser)
+    return parser
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+    # plans live in each worker's memory, so a run can land on a worker
+    # that never saw the plan and get a spurious 404
+    try:
+        scenarios = {name for name, weight in parse_mix(args.mix) if weight > 0}
+    except ValueError as e:
+        parser.error(str(e))
+    if args.spawn and args.backend_workers > 1 and "run" in scenarios:
+        parser.error("--backend-workers > 1 cannot be combined with the run scenario: "
+                     "plans are stored per worker process")
+
+    fake = None
+    backend = None
+    state_dir = None
+    try:
+        if args.spawn:
+            fake = FakeOpenAIServer(config_from_args(args)).start()
+            port = _free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            # never touch the real ~/.luna from a load test
+            state_dir = tempfile.mkdtemp(prefix="luna-loadtest-")
+            backend = spawn_backend(fake.base_url, port, args.backend_workers, state_dir, args.stream)
+            wait_for_health(base_url)
+        else:
+            base_url = args.target.rstrip("/")
+
+        report = asyncio.run(run_load(args, base_url))
+        if fake:
+            report["fake_openai"] = {
+                "config": {
+                    "latency_ms": args.latency_ms,
+                    "jitter_ms": args.jitter_ms,
+                    "failure_rate": args.failure_rate,
+                    "plan_steps": args.plan_steps,
+                    "step_seconds": args.step_seconds,
+                    "stream": args.stream,
+                },
+                "stats": fake.stats.as_dict(),
+            }
+    finally:
+        if backend:
+            backend.terminate()
+            backend.wait(timeout=10)
+        if fake:
+            fake.stop()
+        if state_dir:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+prompt benchmark - legacy planner prompt vs the prompt builder
+
+Provides:
+- The same request mix sent once with the legacy f-string system prompt
+  and once with agent.prompt_builder, each against its own fake server
+- Requests come from several simulated environments (os, package managers,
+  client context), as they would for a shared backend
+- A json report of latency, prompt / cached / completion tokens and the
+  max_tokens each variant asked for
+
+Examples (from src/backend):
+    python -m bench.prompt_bench --requests 200
+    # providers that cache shorter prefixes (e.g. self-hosted prefix caching)
+    python -m bench.prompt_bench --prefill-ms-per-1k 800 --cache-min-tokens 128
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from openai import OpenAI
+
+from agent.prompt_builder import build_messages
+from agent.usage import DEFAULT_MAX_TOKENS, UsageTracker
+from bench.fake_openai import FakeOpenAIServer, add_config_arguments, config_from_args
+from bench.loadtest import percentile
+
+COMMANDS = [
+    "install node",
+    "install docker",
+    "install python and pip",
+    "check node version",
+    "setup react project",
+    "install git then configure git",
+    "check disk space",
+    "install redis and postgres",
+]
+
+ENVIRONMENTS = [
+    ("darwin", ["homebrew", "npm", "pip"], {"project_type": "react", "current_dir": "~/code/web"}),
+    ("darwin", ["homebrew", "pip"], {"current_dir": "~/code/api"}),
+    ("linux", ["apt", "npm", "pip"], {"project_type": "python", "current_dir": "/srv/app"}),
+    ("linux", ["apt"], None),
+    ("windows", ["chocolatey", "npm"], {"project_type": "node"}),
+]
+
+
+def legacy_messages(command: str, os_type: str, package_managers: List[str], context=None) -> List[dict]:
+    """The system prompt as parse_command_with_llm built it before the builder."""
+    system_prompt = f"""you are luna, an AI agent that generates shell commands for development workflows.
+
+CONTEXT:
+- os: {os_type}
+- package managers: {', '.join(package_managers) if package_managers else 'none detected'}
+- sudo is handled automatically via native dialog (no terminal prompts)
+- all commands run non-interactively (no user input required during execution)
+
+TASK: convert the user request into executable shell commands.
+
+RULES:
+1. generate atomic, directly-executable shell commands
+2. risk levels: "safe" (read-only), "moderate" (installs), "dangerous" (sudo/delete)
+3. add verification steps when useful (e.g., check if installed after install)
+4. use the appropriate package manager for the os
+
+COMMAND SYNTAX - CRITICAL:
+✓ CORRECT: curl -fsSL https://example.com/install.sh | bash
+✗ WRONG: /bin/bash -c '$(curl -fsSL https://example.com/install.sh)'
+✗ WRONG: $(curl ...) or backtick command substitution
+
+✓ CORRECT: brew install package
+✓ CORRECT: which brew
+✓ CORRECT: sudo apt-get install -y package
+
+ALWAYS use -y or equivalent for package installs (non-interactive).
+NEVER use interactive flags like -i, --interactive, or expect user input.
+pipe to bash directly for install scripts: curl url | bash
+
+respond with JSON only:
+{{
+  "task_id": "unique_id",
+  "steps": [
+    {{"id": 1, "description": "what this does", "command": "shell command", "risk": "safe|moderate|dangerous"}}
+  ],
+  "requires_confirmation": true,
+  "estimated_time": "time estimate"
+}}"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": command},
+    ]
+
+
+def run_variant(name: str, build: Callable, adaptive: bool, args: argparse.Namespace) -> dict:
+    workload = random.Random(args.seed)
+    tracker = UsageTracker()
+    latencies: List[float] = []
+    max_tokens_sent: List[int] = []
+
+    with FakeOpenAIServer(config_from_args(args)) as server:
+        client = OpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+        for _ in range(args.requests):
+            command = workload.choice(COMMANDS)
+            os_type, package_managers, context = workload.choice(ENVIRONMENTS)
+            messages = build(command, os_type, package_managers, context)
+            max_tokens = tracker.suggest_max_tokens(command) if adaptive else DEFAULT_MAX_TOKENS
+
+            started = time.monotonic()
+            completion = client.chat.completions.create(
+                model="gpt-4o-mini", messages=messages, temperature=0.3, max_tokens=max_tokens
+            )
+            elapsed = time.monotonic() - started
+            tracker.record(command, "fake", completion, max_tokens, elapsed)
+            latencies.append(elapsed * 1000)
+            max_tokens_sent.append(max_tokens)
+
+    usage = tracker.summary(recent=0)
+    values = sorted(latencies)
+    return {
+        "variant": name,
+        "requests": usage["requests"],
+        "latency_ms": {
+            "mean": round(sum(values) / len(values), 2),
+            "p50": round(percentile(values, 50), 2),
+            "p95": round(percentile(values, 95), 2),
+        },
+        "prompt_tokens": usage["prompt_tokens"],
+        "uncached_prompt_tokens": usage["prompt_tokens"] - usage["cached_tokens"],
+        "cached_tokens": usage["cached_tokens"],
+        "cache_hit_ratio": usage["cache_hit_ratio"],
+        "completion_tokens": usage["completion_tokens"],
+        "truncated": usage["truncated"],
+        "mean_max_tokens": round(sum(max_tokens_sent) / len(max_tokens_sent), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="compare the legacy planner prompt with the prompt builder")
+    parser.add_argument("--requests", type=int, default=100, help="requests per variant")
+    parser.add_argument("--seed", type=int, default=7, help="seed for the request mix")
+    add_config_arguments(parser)
+    # keep openai's 1024-token cache floor as the default: the static planner prefix
+    # is shorter than that, so against openai it is never cached
+    parser.set_defaults(latency_ms=50.0, jitter_ms=10.0, prefill_ms_per_1k=400.0)
+    args = parser.parse_args()
+
+    report: Dict[str, dict] = {
+        "legacy": run_variant("legacy", legacy_messages, adaptive=False, args=args),
+        "builder": run_variant("builder", build_messages, adaptive=True, args=args),
+    }
+    legacy, builder = report["legacy"], report["builder"]
+    report["delta"] = {
+        "mean_latency_ms": round(builder["latency_ms"]["mean"] - legacy["latency_ms"]["mean"], 2),
+        "uncached_prompt_tokens": builder["uncached_prompt_tokens"] - legacy["uncached_prompt_tokens"],
+        "mean_max_tokens": round(builder["mean_max_tokens"] - legacy["mean_max_tokens"], 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
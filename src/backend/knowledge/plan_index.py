@@ -0,0 +1,380 @@
+"""
+plan index - reuse past plans for requests that differ by one parameter
+
+Provides:
+- A local index of plans that ran successfully, keyed by os and searched
+  with a character n-gram tf-idf cosine (no network, no extra dependencies)
+- Slot detection: the new request must line up word-for-word with a stored
+  one except for a single parameter (e.g. "install slack" -> "install
+  discord"), which is then substituted into the stored commands, including
+  paths and app names ("/Applications/Slack.app"), keeping its case
+- Safety re-checks of every adapted command with validate_command_safety
+  and get_risk_level; a substitution that raises a step's risk is rejected
+- Hit rate, rejections by reason and estimated llm latency saved, for /health
+
+The index is a json file at LUNA_PLAN_INDEX_PATH (default
+~/.luna/plan-index.json). Requests scoring below LUNA_TEMPLATE_THRESHOLD
+still go to the llm.
+"""
+
+import difflib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from utils.executor import get_risk_level, validate_command_safety
+
+INDEX_ENABLED: bool = os.getenv("LUNA_PLAN_INDEX", "true").lower() != "false"
+INDEX_PATH: str = os.path.expanduser(os.getenv("LUNA_PLAN_INDEX_PATH", "~/.luna/plan-index.json"))
+# cosine similarity, with the substituted slot masked, needed to skip the llm
+SIMILARITY_THRESHOLD: float = float(os.getenv("LUNA_TEMPLATE_THRESHOLD", "0.8"))
+MAX_TEMPLATES: int = 500
+# nearest stored requests checked for a usable slot
+CANDIDATES: int = 5
+NGRAM: int = 3
+
+_RISK_ORDER = {"safe": 0, "moderate": 1, "dangerous": 2}
+# substituted values must look like a package or tool name
+_SLOT_VALUE = re.compile(r"^[a-z0-9][a-z0-9._+@-]*$")
+_SLOT_MASK = "\x00"
+
+
+@dataclass
+class PlanTemplate:
+    """A plan that ran successfully for one request."""
+    request: str
+    os_type: str
+    steps: List[dict]
+    estimated_time: Optional[str]
+    recorded_at: float
+    successes: int = 1
+
+
+@dataclass
+class TemplateMatch:
+    """A stored plan adapted to a new request."""
+    request: str
+    similarity: float
+    # (stored value, new value), or None when the requests are the same
+    slot: Optional[Tuple[str, str]]
+    steps: List[dict]
+    estimated_time: Optional[str]
+
+
+@dataclass
+class IndexStats:
+    lookups: int = 0
+    hits: int = 0
+    # a candidate was close enough but its adapted plan failed a check
+    rejected: int = 0
+    rejected_by_reason: Counter = field(default_factory=Counter)
+    latency_saved_ms: float = 0.0
+    llm_plans: int = 0
+    llm_latency_ms_total: float = 0.0
+
+    def as_dict(self, templates: int, threshold: float) -> dict:
+        mean_llm_ms = self.llm_latency_ms_total / self.llm_plans if self.llm_plans else None
+        return {
+            "enabled": INDEX_ENABLED,
+            "templates": templates,
+            "threshold": threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "rejected": self.rejected,
+            "rejected_by_reason": dict(self.rejected_by_reason),
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "mean_llm_plan_ms": round(mean_llm_ms, 1) if mean_llm_ms is not None else None,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
+
+
+def normalize_request(request: str) -> str:
+    return " ".join(request.lower().split())
+
+
+def _ngrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1))
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram, 0.0) for gram, weight in a.items())
+
+
+def find_slot(stored: str, new: str) -> Optional[Tuple[Optional[Tuple[str, str]], str, str]]:
+    """
+    Line up two normalized requests word by word.
+
+    Returns:
+        (slot, masked stored, masked new), where slot is the one
+        (stored word, new word) pair that differs or None if no word was
+        replaced; None when the requests differ in more than one word
+        position or in their first word (the intent, e.g. install vs
+        uninstall). Inserted or dropped words are allowed and lower the
+        masked similarity instead.
+    """
+    stored_words, new_words = stored.split(), new.split()
+    replaced = [
+        opcode for opcode in difflib.SequenceMatcher(a=stored_words, b=new_words, autojunk=False).get_opcodes()
+        if opcode[0] == "replace"
+    ]
+    if not replaced:
+        return None, stored, new
+    if len(replaced) > 1:
+        return None
+    _, i1, i2, j1, j2 = replaced[0]
+    if i2 - i1 != 1 or j2 - j1 != 1 or i1 == 0 or j1 == 0:
+        return None
+
+    slot = (stored_words[i1], new_words[j1])
+    masked_stored = " ".join(stored_words[:i1] + [_SLOT_MASK] + stored_words[i2:])
+    masked_new = " ".join(new_words[:j1] + [_SLOT_MASK] + new_words[j2:])
+    return slot, masked_stored, masked_new
+
+
+def _match_case(found: str, new: str) -> str:
+    if found.isupper():
+        return new.upper()
+    if found[:1].isupper():
+        return new[:1].upper() + new[1:]
+    return new
+
+
+def _substitute(text: str, old: str, new: str) -> Tuple[str, int]:
+    """
+    Replace the old value wherever it stands alone, keeping its case.
+
+    "Alone" means not joined to other word characters or hyphens, so a path
+    or app name like "/Applications/Slack.app" is rewritten but
+    "create-react-app" never is.
+
+    Returns:
+        (new text, number of whole whitespace-separated tokens replaced)
+    """
+    count = sum(1 for token in text.split(" ") if token == old)
+    pattern = re.compile(rf"(?<![\w-]){re.escape(old)}(?![\w-])", re.IGNORECASE)
+    return pattern.sub(lambda m: _match_case(m.group(0), new), text), count
+
+
+def adapt_steps(
+    steps: List[dict],
+    slot: Optional[Tuple[str, str]],
+) -> Tuple[Optional[List[dict]], Optional[str]]:
+    """
+    Substitute the slot into a stored plan and re-check every command.
+
+    Commands and descriptions are rewritten with the same rule (see
+    _substitute). Steps are not re-planned, so a verification step whose
+    new command get_risk_level doesn't know (e.g. "node --version" ->
+    "deno --version", which is not on its safe list) raises the risk and
+    the template is not used.
+
+    Returns:
+        (adapted steps, None), or (None, reason) where reason is one of
+        bad_value, not_a_parameter, leftover_mention, blocked, risk_raised
+    """
+    if slot is not None:
+        old, new = slot
+        if not _SLOT_VALUE.match(new):
+            return None, "bad_value"
+
+    adapted = []
+    substitutions = 0
+    for step in steps:
+        command, description = step["command"], step["description"]
+        if slot is not None:
+            command, count = _substitute(command, *slot)
+            substitutions += count
+            description, _ = _substitute(description, *slot)
+            # a leftover mention (e.g. inside "create-react-app") would run or describe the old value
+            if old in command.lower() or old in description.lower():
+                return None, "leftover_mention"
+
+        is_safe, _ = validate_command_safety(command)
+        if not is_safe:
+            return None, "blocked"
+        risk = get_risk_level(command)
+        if _RISK_ORDER.get(risk, 1) > _RISK_ORDER.get(get_risk_level(step["command"]), 1):
+            return None, "risk_raised"
+        stored_risk = step.get("risk", "moderate")
+        adapted.append({
+            "id": step["id"],
+            "description": description,
+            "command": command,
+            "risk": risk if _RISK_ORDER.get(risk, 1) > _RISK_ORDER.get(stored_risk, 1) else stored_risk,
+        })
+
+    # the differing word has to be a parameter of the plan, not just of the wording
+    if slot is not None and substitutions == 0:
+        return None, "not_a_parameter"
+    return adapted, None
+
+
+class PlanIndex:
+    """Thread-safe, file-backed index of successful plans."""
+
+    def __init__(self, path: str = INDEX_PATH, threshold: float = SIMILARITY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._templates: Optional[List[PlanTemplate]] = None
+        self._vectors: Optional[List[Dict[str, float]]] = None
+        self._idf: Dict[str, float] = {}
+        self._stats = IndexStats()
+        self._lock = threading.Lock()
+
+    def _load(self) -> List[PlanTemplate]:
+        if self._templates is None:
+            try:
+                with open(self.path) as f:
+                    self._templates = [PlanTemplate(**entry) for entry in json.load(f)]
+            except (FileNotFoundError, json.JSONDecodeError, TypeError):
+                self._templates = []
+        return self._templates
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([asdict(template) for template in self._templates], f)
+        os.replace(tmp_path, self.path)
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        # unseen n-grams get the largest idf, as if they occurred in no document
+        unseen_idf = math.log(len(self._templates) + 1) + 1
+        weights = {
+            gram: (1 + math.log(count)) * self._idf.get(gram, unseen_idf)
+            for gram, count in _ngrams(text).items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {gram: weight / norm for gram, weight in weights.items()}
+
+    def _ensure_vectors(self) -> None:
+        if self._vectors is not None:
+            return
+        templates = self._load()
+        document_freq = Counter(gram for template in templates for gram in _ngrams(template.request))
+        self._idf = {
+            gram: math.log((1 + len(templates)) / (1 + freq)) + 1
+            for gram, freq in document_freq.items()
+        }
+        self._vectors = [self._vectorize(template.request) for template in templates]
+
+    def lookup(self, request: str, os_type: str) -> Optional[TemplateMatch]:
+        """
+        Find a stored plan that can be adapted to the request.
+
+        Returns:
+            The best adapted plan at or above the threshold, or None if the
+            llm should plan this request
+        """
+        if not INDEX_ENABLED:
+            return None
+        started = time.monotonic()
+        request = normalize_request(request)
+
+        with self._lock:
+            self._stats.lookups += 1
+            self._ensure_vectors()
+            query = self._vectorize(request)
+            ranked = sorted(
+                (
+                    (_cosine(query, vector), template)
+                    for template, vector in zip(self._templates, self._vectors)
+                    if template.os_type == os_type
+                ),
+                key=lambda pair: pair[0],
+                reverse=True,
+            )[:CANDIDATES]
+
+            best: Optional[TemplateMatch] = None
+            rejected: Optional[str] = None
+            for _, template in ranked:
+                aligned = find_slot(template.request, request)
+                if aligned is None:
+                    continue
+                slot, masked_stored, masked_new = aligned
+                similarity = _cosine(self._vectorize(masked_stored), self._vectorize(masked_new))
+                if similarity < self.threshold or (best and similarity <= best.similarity):
+                    continue
+                steps, reason = adapt_steps(template.steps, slot)
+                if steps is None:
+                    # the closest rejected candidate explains the miss
+                    rejected = rejected or reason
+                    continue
+                best = TemplateMatch(
+                    request=template.request,
+                    similarity=round(similarity, 3),
+                    slot=slot,
+                    steps=steps,
+                    estimated_time=template.estimated_time,
+                )
+
+            if best is None:
+                if rejected:
+                    self._stats.rejected += 1
+                    self._stats.rejected_by_reason[rejected] += 1
+                return None
+            self._stats.hits += 1
+            if self._stats.llm_plans:
+                mean_llm_ms = self._stats.llm_latency_ms_total / self._stats.llm_plans
+                lookup_ms = (time.monotonic() - started) * 1000
+                self._stats.latency_saved_ms += max(0.0, mean_llm_ms - lookup_ms)
+        return best
+
+    def record(self, request: str, os_type: str, steps: List[dict],
+               estimated_time: Optional[str] = None) -> None:
+        """Store (or refresh) the plan that just ran successfully for a request."""
+        if not INDEX_ENABLED or not steps:
+            return
+        request = normalize_request(request)
+        steps = [
+            {key: step[key] for key in ("id", "description", "command", "risk")}
+            for step in steps
+        ]
+        with self._lock:
+            templates = self._load()
+            existing = next(
+                (t for t in templates if t.request == request and t.os_type == os_type), None
+            )
+            if existing:
+                existing.steps = steps
+                existing.estimated_time = estimated_time
+                existing.recorded_at = time.time()
+                existing.successes += 1
+            else:
+                templates.append(PlanTemplate(request, os_type, steps, estimated_time, time.time()))
+                if len(templates) > MAX_TEMPLATES:
+                    templates.remove(min(templates, key=lambda t: t.recorded_at))
+            self._vectors = None
+            try:
+                self._save()
+            except OSError as e:
+                print(f"   ⚠️  could not save plan index: {e}")
+
+    def observe_llm_latency(self, seconds: float) -> None:
+        """Feed the latency of an llm-planned request, used to estimate savings."""
+        with self._lock:
+            self._stats.llm_plans += 1
+            self._stats.llm_latency_ms_total += seconds * 1000
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._stats.as_dict(len(self._load()), self.threshold)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates = []
+            self._vectors = None
+            self._stats = IndexStats()
+            self._save()
+
+
+index = PlanIndex()
@@ -2,23 +2,117 @@
 luna backend - main entry point
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Literal, Dict, Any
+from typing import List, Optional, Literal, Dict, Any, Tuple
 import uvicorn
+import asyncio
 import platform
 import os
 import json
+import time
+import uuid
 from dotenv import load_dotenv
 from openai import OpenAI
-from utils.executor import execute_command as run_command, check_tool_installed
+from utils.executor import execute_command as run_command, check_tool_installed, remember_tool_state
+from agent.plan_registry import (
+    PlannedStep,
+    StoredPlan,
+    register_plan,
+    get_plan,
+    select_steps,
+    PlanError,
+    PlanNotFoundError,
+    PlanTamperedError,
+)
+from agent.checkpoints import (
+    TaskCheckpoint,
+    start_checkpoint,
+    record_step,
+    load_checkpoint,
+    save_checkpoint,
+    replace_step_command,
+    claim_run,
+    RunInProgressError,
+)
+from agent.watches import (
+    scheduler as watch_scheduler,
+    WatchError,
+    WatchLimitError,
+    WatchNotFoundError,
+)
+from agent.plan_optimizer import optimize_plan, probe_tool
+from agent.prompt_builder import build_messages
+from agent.usage import tracker as usage_tracker
+from knowledge.plan_index import index as plan_index, TemplateMatch
+from agent.resilience import (
+    CircuitBreaker,
+    LatencyTracker,
+    LLMProvider,
+    ResilientPlanner,
+    PlannerUnavailable,
+)
 
 # load environment variables
 load_dotenv()
 
-# initialize openai client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def has_openai_key() -> bool:
+    api_key = os.getenv("OPENAI_API_KEY")
+    return bool(api_key and api_key != "your_openai_api_key_here")
+
+
+def _make_provider(name: str, client: OpenAI, model: str) -> LLMProvider:
+    provider = LLMProvider(
+        name=name,
+        client=client,
+        model=model,
+        breaker=CircuitBreaker(
+            name,
+            failure_threshold=int(os.getenv("LUNA_BREAKER_THRESHOLD", "3")),
+            cooldown_s=float(os.getenv("LUNA_BREAKER_COOLDOWN_S", "30")),
+        ),
+        latency=LatencyTracker(),
+        timeout_s=float(os.getenv("LUNA_PROVIDER_TIMEOUT_S", "30")),
+        stream=os.getenv("LUNA_LLM_STREAM", "false").lower() == "true",
+    )
+    provider.breaker.probe = provider.probe
+    return provider
+
+
+def build_llm_planner() -> ResilientPlanner:
+    """
+    openai first; optionally a local ollama endpoint as hedge / backup
+    """
+    providers = []
+    if has_openai_key():
+        providers.append(_make_provider("openai", OpenAI(api_key=os.getenv("OPENAI_API_KEY")), "gpt-4o-mini"))
+    if os.getenv("LUNA_HEDGE_PROVIDER", "").lower() == "ollama":
+        ollama_client = OpenAI(
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
+            api_key="ollama",  # required by the sdk, ignored by ollama
+        )
+        providers.append(_make_provider("ollama", ollama_client, os.getenv("LUNA_HEDGE_MODEL", os.getenv("LLM_MODEL", "llama3"))))
+
+    return ResilientPlanner(
+        providers,
+        budget_s=float(os.getenv("LUNA_LLM_BUDGET_MS", "8000")) / 1000,
+        hedge=os.getenv("LUNA_HEDGE", "true").lower() != "false",
+        default_hedge_delay_s=float(os.getenv("LUNA_HEDGE_DELAY_MS", "2000")) / 1000,
+    )
+
+
+# smallest per-request planning budget a client may ask for
+MIN_LLM_BUDGET_MS: int = int(os.getenv("LUNA_LLM_MIN_BUDGET_MS", "1000"))
+
+# legacy /api/execute/run with a bare steps array and no plan_id; off by default,
+# since it runs whatever commands the client sends
+ALLOW_UNPLANNED_STEPS: bool = os.getenv("LUNA_ALLOW_UNPLANNED_STEPS", "false").lower() == "true"
+
+# initialize llm planner (deadline, circuit breaker, hedging)
+llm_planner = build_llm_planner()
 
 app = FastAPI(
     title="luna agent api",
@@ -46,11 +140,28 @@ class ExecuteStep(BaseModel):
     command: str
     risk: Literal["safe", "moderate", "dangerous"]
     status: Optional[Literal["pending", "running", "completed", "failed"]] = "pending"
+    # set when the optimizer merged several planned steps into this one
+    source_step_ids: Optional[List[int]] = None
+
+
+class PlanRewrite(BaseModel):
+    kind: Literal["merge_installs", "drop_probe"]
+    step_ids: List[int]
+    detail: str
 
 
 class ExecuteRequest(BaseModel):
     command: str
     context: Optional[dict] = None
+    latency_budget_ms: Optional[int] = None
+
+
+class TemplateReuse(BaseModel):
+    # the earlier request whose successful plan was adapted
+    request: str
+    similarity: float
+    # [old value, new value]; null when the plan was reused unchanged
+    slot: Optional[List[str]] = None
 
 
 class ExecuteResponse(BaseModel):
@@ -58,11 +169,25 @@ class ExecuteResponse(BaseModel):
     steps: List[ExecuteStep]
     requires_confirmation: bool
     estimated_time: Optional[str] = None
+    plan_id: Optional[str] = None
+    plan_expires_at: Optional[float] = None
+    optimizations: List[PlanRewrite] = []
+    source: Literal["llm", "template", "builtin"] = "builtin"
+    template: Optional[TemplateReuse] = None
 
 
 class ExecuteAllRequest(BaseModel):
-    task_id: str
-    steps: List[Dict[str, Any]]
+    task_id: Optional[str] = None
+    plan_id: Optional[str] = None
+    step_ids: Optional[List[int]] = None
+    # with plan_id: only checked for tampering; without: legacy, needs LUNA_ALLOW_UNPLANNED_STEPS
+    steps: Optional[List[Dict[str, Any]]] = None
+
+
+class InstallerScript(BaseModel):
+    url: str
+    sha256: str
+    source: Literal["network", "revalidated", "offline", "pinned"]
 
 
 class StepResult(BaseModel):
@@ -70,18 +195,51 @@ class StepResult(BaseModel):
     status: Literal["completed", "failed"]
     output: str
     error: Optional[str] = None
+    source_step_ids: Optional[List[int]] = None
+    # true when the step completed in an earlier run and was not re-run
+    from_checkpoint: bool = False
+    # set when a curl|bash installer ran from the local script cache
+    script: Optional[InstallerScript] = None
 
 
 class ExecuteAllResponse(BaseModel):
     task_id: str
     results: List[StepResult]
     overall_status: Literal["completed", "failed", "partial"]
+    plan_id: Optional[str] = None
+
+
+class ResumeRequest(BaseModel):
+    plan_id: str
+    # replaces the command of the first failed or unrun step
+    edited_command: Optional[str] = None
+    rerun_step_ids: Optional[List[int]] = None
 
 
-def parse_command_with_llm(command: str, os_type: str) -> ExecuteResponse:
+class WatchRequest(BaseModel):
+    plan_id: str
+    step_ids: Optional[List[int]] = None
+    interval_s: Optional[float] = None
+
+
+class WatchResponse(BaseModel):
+    watch_id: str
+    plan_id: str
+    step_ids: List[int]
+    interval_s: float
+
+
+def parse_command_with_llm(command: str, os_type: str, budget_s: Optional[float] = None,
+                           context: Optional[dict] = None) -> ExecuteResponse:
     """
     use llm to parse any command and generate execution steps
+
+    the whole call (tool detection included) is bounded by budget_s; when
+    it runs out or every provider's circuit is open, the hardcoded parser
+    answers instead
     """
+    started = time.monotonic()
+    budget_s = budget_s if budget_s is not None else llm_planner.budget_s
     
     # detect available package managers
     available_package_managers = []
@@ -96,55 +254,21 @@ def parse_command_with_llm(command: str, os_type: str) -> ExecuteResponse:
     if check_tool_installed("pip"):
         available_package_managers.append("pip")
     
-    system_prompt = f"""you are luna, an AI agent that generates shell commands for development workflows.
-
-CONTEXT:
-- os: {os_type}
-- package managers: {', '.join(available_package_managers) if available_package_managers else 'none detected'}
-- sudo is handled automatically via native dialog (no terminal prompts)
-- all commands run non-interactively (no user input required during execution)
-
-TASK: convert the user request into executable shell commands.
-
-RULES:
-1. generate atomic, directly-executable shell commands
-2. risk levels: "safe" (read-only), "moderate" (installs), "dangerous" (sudo/delete)
-3. add verification steps when useful (e.g., check if installed after install)
-4. use the appropriate package manager for the os
-
-COMMAND SYNTAX - CRITICAL:
-✓ CORRECT: curl -fsSL https://example.com/install.sh | bash
-✗ WRONG: /bin/bash -c '$(curl -fsSL https://example.com/install.sh)'
-✗ WRONG: $(curl ...) or backtick command substitution
-
-✓ CORRECT: brew install package
-✓ CORRECT: which brew
-✓ CORRECT: sudo apt-get install -y package
-
-ALWAYS use -y or equivalent for package installs (non-interactive).
-NEVER use interactive flags like -i, --interactive, or expect user input.
-pipe to bash directly for install scripts: curl url | bash
-
-respond with JSON only:
-{{
-  "task_id": "unique_id",
-  "steps": [
-    {{"id": 1, "description": "what this does", "command": "shell command", "risk": "safe|moderate|dangerous"}}
-  ],
-  "requires_confirmation": true,
-  "estimated_time": "time estimate"
-}}"""
+    # static instructions first so providers can cache the prefix; context last
+    messages = build_messages(command, os_type, available_package_managers, context)
+    max_tokens = usage_tracker.suggest_max_tokens(command)
 
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",  # faster and cheaper
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": command}
-            ],
+        call_started = time.monotonic()
+        response, provider = llm_planner.complete(
+            messages,
+            budget_s=budget_s - (time.monotonic() - started),
             temperature=0.3,
-            max_tokens=1000
+            max_tokens=max_tokens
         )
+        usage_tracker.record(command, provider, response, max_tokens, time.monotonic() - call_started)
+        plan_index.observe_llm_latency(time.monotonic() - started)
+        print(f"   🤖 plan from {provider}")
         
         # parse the response
         response_text = response.choices[0].message.content.strip()
@@ -173,9 +297,13 @@ respond with JSON only:
             task_id=parsed.get("task_id", f"task_{hash(command)}"),
             steps=steps,
             requires_confirmation=parsed.get("requires_confirmation", True),
-            estimated_time=parsed.get("estimated_time", "unknown")
+            estimated_time=parsed.get("estimated_time", "unknown"),
+            source="llm"
         )
         
+    except PlannerUnavailable as e:
+        print(f"⚡ llm unavailable, using fallback: {e}")
+        return parse_command_hardcoded(command, os_type)
     except Exception as e:
         print(f"❌ llm parsing failed: {e}")
         # fallback to hardcoded parser
@@ -337,18 +465,52 @@ def parse_command_hardcoded(command: str, os_type: str) -> ExecuteResponse:
     )
 
 
-def parse_command(command: str) -> ExecuteResponse:
+def parse_command_from_template(match: TemplateMatch) -> ExecuteResponse:
+    """
+    build a response from a past plan adapted by the plan index
+    """
+    return ExecuteResponse(
+        task_id=f"task_{uuid.uuid4().hex[:8]}",
+        steps=[
+            ExecuteStep(
+                id=step["id"],
+                description=step["description"],
+                command=step["command"],
+                risk=step["risk"]
+            )
+            for step in match.steps
+        ],
+        requires_confirmation=True,
+        estimated_time=match.estimated_time,
+        source="template",
+        template=TemplateReuse(
+            request=match.request,
+            similarity=match.similarity,
+            slot=list(match.slot) if match.slot else None
+        )
+    )
+
+
+def parse_command(command: str, budget_ms: Optional[int] = None,
+                  context: Optional[dict] = None) -> ExecuteResponse:
     """
-    main entry point - try llm first, fallback to hardcoded
+    main entry point - reuse a similar past plan, else try llm, fallback to hardcoded
     """
     os_type = platform.system().lower()
     
-    # check if openai api key is available
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key and api_key != "your_openai_api_key_here":
+    # check if any llm provider is configured
+    if llm_planner.enabled:
+        # a past plan that differs by one parameter skips the llm round-trip
+        match = plan_index.lookup(command, os_type)
+        if match:
+            slot = f" ({match.slot[0]} -> {match.slot[1]})" if match.slot else ""
+            print(f"📚 reusing plan for '{match.request}'{slot}, similarity {match.similarity}")
+            return parse_command_from_template(match)
         try:
             print(f"🤖 parsing with llm: {command}")
-            return parse_command_with_llm(command, os_type)
+            # client-supplied budgets below the floor would only ever time out
+            budget_s = max(budget_ms, MIN_LLM_BUDGET_MS) / 1000 if budget_ms is not None else None
+            return parse_command_with_llm(command, os_type, budget_s, context)
         except Exception as e:
             print(f"⚠️  llm failed, using fallback: {e}")
             return parse_command_hardcoded(command, os_type)
@@ -370,93 +532,386 @@ async def root():
 @app.get("/health")
 async def health():
     """detailed health check"""
-    has_api_key = bool(os.getenv("OPENAI_API_KEY") and os.getenv("OPENAI_API_KEY") != "your_openai_api_key_here")
-    
     return {
         "status": "healthy",
         "services": {
             "api": "ok",
             "os": platform.system(),
             "python": platform.python_version(),
-            "llm": "enabled" if has_api_key else "disabled (using fallback parser)"
+            "llm": "enabled" if llm_planner.enabled else "disabled (using fallback parser)",
+            "llm_providers": llm_planner.status(),
+            "plan_templates": plan_index.stats()
         }
     }
 
 
+@app.get("/api/usage")
+async def llm_usage():
+    """token usage of recent llm planning requests"""
+    return usage_tracker.summary()
+
+
+# blocking handlers (planner calls, subprocesses) are plain def so fastapi runs
+# them in its threadpool and the event loop stays free for /health and watch streams
 @app.post("/api/execute", response_model=ExecuteResponse)
-async def execute_command_endpoint(request: ExecuteRequest):
+def execute_command_endpoint(request: ExecuteRequest):
     """
     parse and plan command execution
     """
     try:
-        response = parse_command(request.command)
-        return response
+        response = parse_command(request.command, request.latency_budget_ms, request.context)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    # coalesce installs and drop redundant probes before anything runs
+    if os.getenv("LUNA_OPTIMIZE_PLANS", "true").lower() != "false":
+        response.steps, rewrites = optimize_plan(response.steps)
+        response.optimizations = [PlanRewrite(**rewrite) for rewrite in rewrites]
+        for rewrite in rewrites:
+            print(f"   ✂️  {rewrite['detail']}")
+
+    # record the plan so /api/execute/run can reference it by id
+    plan = register_plan(
+        response.task_id,
+        response.steps,
+        request=request.command,
+        source=response.source,
+        estimated_time=response.estimated_time,
+    )
+    risk_by_id = {step.id: step.risk for step in plan.steps}
+    for step in response.steps:
+        step.risk = risk_by_id[step.id]
+    response.plan_id = plan.plan_id
+    response.plan_expires_at = plan.expires_at
+    return response
 
-@app.post("/api/execute/run", response_model=ExecuteAllResponse)
-async def execute_all_steps(request: ExecuteAllRequest):
+
+def _run_step(step_id: int, command: str, **kwargs) -> StepResult:
     """
-    execute all steps of a task
+    execute one step and log its outcome
     """
+    print(f"🔄 executing step {step_id}: {command}")
+
+    # execute the command (sudo is handled seamlessly via macOS dialog if needed)
+    script_report: Dict[str, str] = {}
+    success, stdout, stderr = run_command(command, timeout=300, script_report=script_report, **kwargs)
+
+    print(f"{'✅' if success else '❌'} step {step_id}: {'completed' if success else 'failed'}")
+    if stdout:
+        print(f"   stdout: {stdout[:200]}...")
+    if stderr:
+        print(f"   stderr: {stderr[:200]}...")
+
+    # a successful `which X` step refreshes the cached toolchain state
+    tool = probe_tool(command or "")
+    if tool and success:
+        remember_tool_state(tool, True)
+
+    return StepResult(
+        step_id=step_id,
+        status="completed" if success else "failed",
+        output=stdout,
+        error=stderr if not success else None,
+        script=InstallerScript(**script_report) if script_report else None
+    )
+
+
+def _run_planned_step(step: PlannedStep, script_pin: Optional[str] = None) -> StepResult:
+    """
+    execute one planned step using the analysis recorded at plan time
+    """
+    if not step.is_safe:
+        result = StepResult(
+            step_id=step.id,
+            status="failed",
+            output="",
+            error=f"command blocked: {step.block_reason}"
+        )
+    else:
+        result = _run_step(
+            step.id,
+            step.command,
+            require_sudo=step.needs_sudo,
+            env=step.build_env(),
+            prevalidated=True,
+            script_pin=script_pin
+        )
+    result.source_step_ids = step.source_step_ids
+    return result
+
+
+def _run_checkpointed(checkpoint: TaskCheckpoint, rerun_step_ids: Optional[List[int]] = None) -> List[StepResult]:
+    """
+    run a checkpoint's steps in order, persisting progress after each one
+
+    completed steps are reported from the checkpoint instead of re-running,
+    unless they are listed in rerun_step_ids
+    """
+    rerun = set(rerun_step_ids or [])
     results = []
-    overall_success = True
-    
-    for step in request.steps:
-        command = step.get("command")
-        step_id = step.get("id")
-        
-        print(f"🔄 executing step {step_id}: {command}")
-        
-        # execute the command (sudo is handled seamlessly via macOS dialog if needed)
-        success, stdout, stderr = run_command(command, timeout=300)
-        
-        print(f"{'✅' if success else '❌'} step {step_id}: {'completed' if success else 'failed'}")
-        if stdout:
-            print(f"   stdout: {stdout[:200]}...")
-        if stderr:
-            print(f"   stderr: {stderr[:200]}...")
-        
-        results.append(
-            StepResult(
-                step_id=step_id,
-                status="completed" if success else "failed",
-                output=stdout,
-                error=stderr if not success else None
-            )
+    for entry in checkpoint.steps:
+        step = entry.step
+        if entry.status == "completed" and step.id not in rerun:
+            print(f"⏭️  step {step.id}: completed earlier, skipping")
+            results.append(StepResult(
+                step_id=step.id,
+                status="completed",
+                output=entry.output,
+                source_step_ids=step.source_step_ids,
+                from_checkpoint=True
+            ))
+            continue
+
+        # re-runs of an installer use the exact script bytes of the earlier run
+        result = _run_planned_step(step, script_pin=entry.script_sha256)
+        record_step(
+            checkpoint, step.id, result.status, result.output, result.error,
+            script_sha256=result.script.sha256 if result.script else None
         )
-        
+        results.append(result)
+
         # stop on first failure
-        if not success:
-            overall_success = False
+        if result.status == "failed":
             break
-    
-    # determine overall status
-    if overall_success:
-        overall_status = "completed"
+
+    return results
+
+
+def _overall_status(results: List[StepResult], total_steps: int) -> str:
+    """
+    summarize step results into completed / partial / failed
+    """
+    if all(r.status == "completed" for r in results):
+        return "completed"
     elif len(results) == 0:
-        overall_status = "failed"
-    elif len(results) < len(request.steps):
-        overall_status = "partial"
+        return "failed"
+    elif len(results) < total_steps:
+        return "partial"
+    return "failed"
+
+
+def _record_template(plan: StoredPlan, steps: List[PlannedStep], results: List[StepResult]) -> None:
+    """
+    a full plan that ran cleanly becomes a template for similar requests
+    """
+    ran_all = len(steps) == len(plan.steps) and len(results) == len(steps)
+    completed = ran_all and all(r.status == "completed" for r in results)
+    if completed and plan.request and plan.source in ("llm", "template"):
+        plan_index.record(
+            plan.request,
+            platform.system().lower(),
+            [{"id": s.id, "description": s.description, "command": s.command, "risk": s.risk} for s in steps],
+            estimated_time=plan.estimated_time,
+        )
+
+
+def _run_planned_steps(request: ExecuteAllRequest) -> Tuple[List[StepResult], int, str]:
+    """
+    execute steps of a stored plan, checkpointing progress per step
+    """
+    try:
+        plan = get_plan(request.plan_id)
+        submitted = None
+        if request.steps:
+            submitted = {step.get("id"): step.get("command") for step in request.steps}
+        selected = select_steps(plan, request.step_ids, submitted)
+    except PlanNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PlanTamperedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PlanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        with claim_run(plan.plan_id):
+            checkpoint = start_checkpoint(plan.plan_id, plan.task_id, selected)
+            results = _run_checkpointed(checkpoint)
+    except RunInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    _record_template(plan, plan.steps, results)
+    return results, len(selected), plan.task_id
+
+
+@app.post("/api/execute/run", response_model=ExecuteAllResponse)
+def execute_all_steps(request: ExecuteAllRequest):
+    """
+    execute the steps of a task
+
+    takes a plan_id from /api/execute (optionally with a step_ids subset);
+    a bare steps array is only accepted with LUNA_ALLOW_UNPLANNED_STEPS=true
+    """
+    if request.plan_id:
+        results, total_steps, task_id = _run_planned_steps(request)
+    elif request.steps is not None:
+        if not ALLOW_UNPLANNED_STEPS:
+            raise HTTPException(
+                status_code=400,
+                detail="plan_id is required (steps without a plan are disabled, see LUNA_ALLOW_UNPLANNED_STEPS)"
+            )
+        results = []
+        for step in request.steps:
+            result = _run_step(step.get("id"), step.get("command"))
+            results.append(result)
+
+            # stop on first failure
+            if result.status == "failed":
+                break
+        total_steps = len(request.steps)
+        task_id = request.task_id
     else:
-        overall_status = "failed"
-    
+        raise HTTPException(status_code=400, detail="plan_id is required")
+
     return ExecuteAllResponse(
-        task_id=request.task_id,
+        task_id=task_id or "",
         results=results,
-        overall_status=overall_status
+        overall_status=_overall_status(results, total_steps),
+        plan_id=request.plan_id
     )
 
 
+@app.post("/api/execute/resume", response_model=ExecuteAllResponse)
+def resume_task(request: ResumeRequest):
+    """
+    continue a checkpointed run from its first failed or unrun step
+
+    works across backend restarts; completed steps are skipped unless
+    listed in rerun_step_ids
+    """
+    try:
+        with claim_run(request.plan_id):
+            return _resume_checkpoint(request)
+    except RunInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+def _resume_checkpoint(request: ResumeRequest) -> ExecuteAllResponse:
+    """
+    load, optionally edit, and continue a checkpoint; the caller holds the run claim
+    """
+    try:
+        checkpoint = load_checkpoint(request.plan_id)
+    except PlanNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PlanError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    known_ids = {entry.step.id for entry in checkpoint.steps}
+    unknown = [step_id for step_id in request.rerun_step_ids or [] if step_id not in known_ids]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown step ids: {unknown}")
+
+    if request.edited_command is not None:
+        entry = checkpoint.resume_entry()
+        if entry is None:
+            raise HTTPException(status_code=400, detail="no failed or unrun step to edit")
+        print(f"✏️  step {entry.step.id}: {entry.step.command} -> {request.edited_command}")
+        replace_step_command(entry, request.edited_command)
+        save_checkpoint(checkpoint)
+
+    results = _run_checkpointed(checkpoint, request.rerun_step_ids)
+
+    # the plan itself is gone after a restart or once it expires; then there is nothing to record
+    try:
+        plan = get_plan(checkpoint.plan_id)
+    except PlanNotFoundError:
+        plan = None
+    if plan:
+        _record_template(plan, [entry.step for entry in checkpoint.steps], results)
+
+    return ExecuteAllResponse(
+        task_id=checkpoint.task_id,
+        results=results,
+        overall_status=_overall_status(results, len(checkpoint.steps)),
+        plan_id=checkpoint.plan_id
+    )
+
+
+@app.post("/api/watch", response_model=WatchResponse)
+async def create_watch(request: WatchRequest):
+    """
+    turn a safe-only plan into a recurring status check
+    """
+    try:
+        plan = get_plan(request.plan_id)
+        selected = select_steps(plan, request.step_ids)
+        watch = watch_scheduler.create(plan.plan_id, selected, request.interval_s)
+    except PlanNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except WatchLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except (PlanError, WatchError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    print(f"👀 watching plan {plan.plan_id[:8]} every {watch.interval_s:g}s")
+    return WatchResponse(
+        watch_id=watch.watch_id,
+        plan_id=plan.plan_id,
+        step_ids=[step.id for step in selected],
+        interval_s=watch.interval_s
+    )
+
+
+@app.get("/api/watch")
+async def list_watches():
+    """list active watches"""
+    return {"watches": watch_scheduler.list()}
+
+
+@app.get("/api/watch/{watch_id}/events")
+async def watch_events(watch_id: str, request: Request):
+    """
+    server-sent events: a snapshot first, then only per-step diffs
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def push(event: dict) -> None:
+        # called from the scheduler thread
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    try:
+        snapshot = watch_scheduler.subscribe(watch_id, push)
+    except WatchNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def stream():
+        try:
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                    yield f"data: {json.dumps(event)}\n\n"
+                except asyncio.TimeoutError:
+                    try:
+                        watch_scheduler.get(watch_id)
+                    except WatchNotFoundError:
+                        yield "event: end\ndata: {}\n\n"
+                        return
+                    yield ": keepalive\n\n"
+        finally:
+            watch_scheduler.unsubscribe(watch_id, push)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.delete("/api/watch/{watch_id}")
+async def cancel_watch(watch_id: str):
+    """stop a watch"""
+    try:
+        watch_scheduler.cancel(watch_id)
+    except WatchNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"watch_id": watch_id, "status": "cancelled"}
+
+
 if __name__ == "__main__":
     print("🌙 starting luna backend...")
     print("📍 api docs: http://127.0.0.1:8000/docs")
     print(f"💻 os: {platform.system()}")
     
     # check api key status
-    api_key = os.getenv("OPENAI_API_KEY")
-    if api_key and api_key != "your_openai_api_key_here":
+    if has_openai_key():
         print("🤖 llm: enabled (gpt-4o-mini)")
     else:
         print("⚠️  llm: disabled (add OPENAI_API_KEY to .env)")
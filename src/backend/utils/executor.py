@@ -6,18 +6,34 @@ Provides:
 - Credential caching (~5 minutes per macOS default)
 - Auto-detection of commands needing elevated privileges
 - Non-interactive mode for Homebrew and other installers
+- Local content-addressed cache for curl|bash installer scripts
 """
 
 import subprocess
 import platform
 import os
+import re
 import time
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
+
+from utils.script_cache import (
+    ScriptFetchError,
+    build_cached_command,
+    parse_pipe_install,
+    resolve_script,
+)
 
 # Track when we last acquired sudo credentials
 _sudo_timestamp: float = 0
 _SUDO_CACHE_DURATION: int = 280  # slightly less than macOS default 5 min
 
+# Toolchain state: tool name -> (installed, checked_at)
+_tool_cache: Dict[str, Tuple[bool, float]] = {}
+_TOOL_CACHE_DURATION: int = 300
+
+# chaining, pipes, redirection, substitution or backgrounding: more than one plain command
+_SHELL_CONTROL = re.compile(r"(;|&|\||>|<|`|\$\(|\n)")
+
 
 def _check_sudo_cached() -> bool:
     """
@@ -195,7 +211,11 @@ def get_execution_env(command: str) -> dict:
 def execute_command(
     command: str,
     timeout: int = 300,
-    require_sudo: bool = False
+    require_sudo: bool = False,
+    env: Optional[dict] = None,
+    prevalidated: bool = False,
+    script_pin: Optional[str] = None,
+    script_report: Optional[dict] = None
 ) -> Tuple[bool, str, str]:
     """
     Execute a shell command with seamless sudo handling.
@@ -207,24 +227,43 @@ def execute_command(
         command: Shell command to execute
         timeout: Max execution time in seconds (default 5 minutes)
         require_sudo: Force sudo access request
+        env: Precomputed execution environment (skips get_execution_env)
+        prevalidated: Safety and sudo checks were already done at plan time;
+            require_sudo is then taken as the final sudo verdict
+        script_pin: For curl|bash installers, run these cached bytes (sha256)
+        script_report: Filled with url, sha256 and source of the installer
+            script when the command was routed through the script cache
 
     Returns:
         Tuple of (success: bool, stdout: str, stderr: str)
     """
     # Validate command safety first
-    is_safe, reason = validate_command_safety(command)
-    if not is_safe:
-        return False, "", f"command blocked: {reason}"
+    if not prevalidated:
+        is_safe, reason = validate_command_safety(command)
+        if not is_safe:
+            return False, "", f"command blocked: {reason}"
 
     try:
         # Check if command needs sudo
-        if require_sudo or needs_sudo(command):
+        if require_sudo or (not prevalidated and needs_sudo(command)):
             print(f"   🔒 elevated privileges required")
             if not ensure_sudo_access():
                 return False, "", "sudo access denied - user cancelled authentication"
 
         # Get appropriate environment
-        env = get_execution_env(command)
+        if env is None:
+            env = get_execution_env(command)
+
+        # Run curl|bash installers from the local content-addressed cache
+        pipe = parse_pipe_install(command)
+        if pipe and os.getenv("LUNA_SCRIPT_CACHE", "true").lower() != "false":
+            # a pinned re-run uses exactly the earlier bytes or fails; it never
+            # silently fetches whatever the url serves now
+            script = resolve_script(pipe.url, pinned_sha256=script_pin)
+            print(f"   📦 installer script {script.sha256[:12]} ({script.source})")
+            command = build_cached_command(pipe, script)
+            if script_report is not None:
+                script_report.update(url=script.url, sha256=script.sha256, source=script.source)
 
         # Platform-specific shell handling
         if platform.system() == "Windows":
@@ -257,22 +296,51 @@ def execute_command(
 
         return success, result.stdout, result.stderr
 
+    except ScriptFetchError as e:
+        return False, "", f"installer script unavailable: {e}"
     except subprocess.TimeoutExpired:
         return False, "", f"command timed out after {timeout} seconds"
     except Exception as e:
         return False, "", f"execution error: {str(e)}"
 
 
-def check_tool_installed(tool: str) -> bool:
+def get_cached_tool_state(tool: str) -> Optional[bool]:
+    """
+    Return the cached installed/missing verdict for a tool, or None if it
+    was never checked or the entry is stale.
+    """
+    entry = _tool_cache.get(tool)
+    if entry is None or time.time() - entry[1] >= _TOOL_CACHE_DURATION:
+        return None
+    return entry[0]
+
+
+def remember_tool_state(tool: str, installed: bool) -> None:
+    """
+    Record a tool's state learned elsewhere (e.g. from a probe step's result).
+    """
+    _tool_cache[tool] = (installed, time.time())
+
+
+def check_tool_installed(tool: str, use_cache: bool = True) -> bool:
     """
     Check if a command line tool is installed and accessible.
 
+    Results are cached for a few minutes so repeated planning requests
+    don't spawn a `which` process per package manager every time.
+
     Args:
         tool: Name of the tool to check (e.g., 'brew', 'node', 'python')
+        use_cache: Reuse a recent result instead of probing again
 
     Returns:
         True if tool is found in PATH, False otherwise
     """
+    if use_cache:
+        cached = get_cached_tool_state(tool)
+        if cached is not None:
+            return cached
+
     try:
         if platform.system() == "Windows":
             command = f"where {tool}"
@@ -286,10 +354,13 @@ def check_tool_installed(tool: str) -> bool:
             text=True,
             timeout=5
         )
-        return result.returncode == 0
+        installed = result.returncode == 0
     except:
         return False
 
+    remember_tool_state(tool, installed)
+    return installed
+
 
 def validate_command_safety(command: str) -> Tuple[bool, Optional[str]]:
     """
@@ -342,6 +413,13 @@ def validate_command_safety(command: str) -> Tuple[bool, Optional[str]]:
     return True, None
 
 
+def has_shell_control(command: str) -> bool:
+    """
+    Check for shell syntax that chains, pipes, redirects or substitutes.
+    """
+    return bool(_SHELL_CONTROL.search(command))
+
+
 def get_risk_level(command: str) -> str:
     """
     Assess the risk level of a command.
@@ -353,7 +431,8 @@ def get_risk_level(command: str) -> str:
     """
     command_lower = command.lower()
 
-    # Safe: read-only operations
+    # Safe: read-only operations, and only as a single plain command - a
+    # read-only part never makes a chained or redirected command safe
     safe_patterns = [
         "which ", "where ", "ls ", "cat ", "echo ", "pwd",
         "docker ps", "docker images", "docker --version",
@@ -361,10 +440,19 @@ def get_risk_level(command: str) -> str:
         "node --version", "npm --version", "python --version",
         "brew --version", "brew list", "brew info",
     ]
+    # status commands: matched only as the whole command or its prefix
+    status_commands = [
+        "docker info", "docker version", "docker compose ps", "docker stats --no-stream",
+        "git --version", "brew services list", "uptime", "df -h",
+    ]
 
-    for pattern in safe_patterns:
-        if command_lower.startswith(pattern) or f" {pattern}" in command_lower:
-            return "safe"
+    if not has_shell_control(command):
+        for pattern in safe_patterns:
+            if command_lower.startswith(pattern) or f" {pattern}" in command_lower:
+                return "safe"
+        for pattern in status_commands:
+            if command_lower == pattern or command_lower.startswith(f"{pattern} "):
+                return "safe"
 
     # Dangerous: sudo, rm, system modifications
     dangerous_patterns = [
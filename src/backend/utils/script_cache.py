@@ -0,0 +1,294 @@
+"""
+installer script cache - content-addressed storage for curl|bash installers
+
+Provides:
+- Detection of `curl <url> | bash` / `wget -qO- <url> | sh` pipelines
+- A local content-addressed store (objects named by sha256) with an index
+  of url -> current hash, etag and last-modified
+- Conditional revalidation (If-None-Match / If-Modified-Since) so unchanged
+  scripts are not downloaded again
+- Offline reuse: if the network is unavailable the last pinned bytes run
+- Pruning of unused objects, keeping scripts pinned by task checkpoints
+
+Usage:
+    python -m utils.script_cache list
+    python -m utils.script_cache prune --max-age-days 30
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shlex
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+CACHE_DIR: str = os.path.expanduser(os.getenv("LUNA_SCRIPT_CACHE_DIR", "~/.luna/script-cache"))
+MAX_SCRIPT_BYTES: int = 5 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS: float = 30.0
+
+_INTERPRETERS = {"bash", "sh", "zsh"}
+# anything beyond a single plain pipe is left to the shell untouched
+_COMPLEX_SHELL = re.compile(r"(\|\||&&|;|\$\(|`|<|>|\n)")
+_URL = re.compile(r"^https?://\S+$")
+_lock = threading.Lock()
+
+
+class ScriptFetchError(Exception):
+    """Script could not be fetched and no cached copy exists."""
+
+
+@dataclass
+class PipeInstall:
+    """A parsed `fetch url | interpreter` pipeline."""
+    url: str
+    fetcher: str
+    sudo: bool
+    interpreter: str
+    interpreter_args: List[str]
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    sha256: str
+    size: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    last_used: float
+
+
+@dataclass
+class ResolvedScript:
+    url: str
+    sha256: str
+    path: str
+    source: str  # network | revalidated | offline | pinned
+
+
+def parse_pipe_install(command: str) -> Optional[PipeInstall]:
+    """
+    Recognize a plain remote-installer pipeline.
+
+    Returns None for anything else, including fetches with flags that take
+    arguments (headers, output files) or extra shell syntax.
+    """
+    if command.count("|") != 1 or _COMPLEX_SHELL.search(command):
+        return None
+
+    left, right = command.split("|")
+    try:
+        fetch_tokens = shlex.split(left)
+        run_tokens = shlex.split(right)
+    except ValueError:
+        return None
+
+    if not fetch_tokens or fetch_tokens[0] not in ("curl", "wget"):
+        return None
+    urls = [token for token in fetch_tokens[1:] if _URL.match(token)]
+    others = [token for token in fetch_tokens[1:] if not _URL.match(token)]
+    if len(urls) != 1 or any(not token.startswith("-") for token in others):
+        return None
+    if fetch_tokens[0] == "curl" and any(token in ("-o", "--output", "-O") for token in others):
+        return None
+
+    sudo = bool(run_tokens) and run_tokens[0] == "sudo"
+    if sudo:
+        run_tokens = run_tokens[1:]
+        while run_tokens and run_tokens[0] in ("-E", "-H"):
+            run_tokens = run_tokens[1:]
+    if not run_tokens or os.path.basename(run_tokens[0]) not in _INTERPRETERS:
+        return None
+
+    return PipeInstall(
+        url=urls[0],
+        fetcher=fetch_tokens[0],
+        sudo=sudo,
+        interpreter=run_tokens[0],
+        interpreter_args=run_tokens[1:],
+    )
+
+
+def _index_path() -> str:
+    return os.path.join(CACHE_DIR, "index.json")
+
+
+def _object_path(sha256: str) -> str:
+    return os.path.join(CACHE_DIR, "objects", sha256)
+
+
+def _load_index() -> Dict[str, CacheEntry]:
+    try:
+        with open(_index_path()) as f:
+            return {url: CacheEntry(**entry) for url, entry in json.load(f).items()}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_index(index: Dict[str, CacheEntry]) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{_index_path()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({url: asdict(entry) for url, entry in index.items()}, f, indent=2)
+    os.replace(tmp_path, _index_path())
+
+
+def _store_object(content: bytes) -> str:
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = _object_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return sha256
+
+
+def _verify_object(sha256: str) -> bool:
+    """Cached bytes must still hash to their name before they are run."""
+    try:
+        with open(_object_path(sha256), "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest() == sha256
+    except OSError:
+        return False
+
+
+def resolve_script(url: str, pinned_sha256: Optional[str] = None) -> ResolvedScript:
+    """
+    Get a verified local copy of an installer script.
+
+    Args:
+        url: Script url from the pipeline
+        pinned_sha256: Run exactly these bytes from the cache, no network
+
+    Raises:
+        ScriptFetchError: if nothing usable could be fetched or found
+    """
+    if pinned_sha256:
+        if not _verify_object(pinned_sha256):
+            raise ScriptFetchError(f"pinned script {pinned_sha256[:12]} is not in the cache")
+        return ResolvedScript(url, pinned_sha256, _object_path(pinned_sha256), "pinned")
+
+    with _lock:
+        cached = _load_index().get(url)
+    if cached and not _verify_object(cached.sha256):
+        cached = None
+
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    try:
+        response = httpx.get(url, headers=headers, timeout=FETCH_TIMEOUT_SECONDS, follow_redirects=True)
+    except httpx.HTTPError as e:
+        if cached:
+            print(f"   📦 offline, using cached script {cached.sha256[:12]}")
+            return _touch(cached, "offline")
+        raise ScriptFetchError(f"failed to fetch {url}: {e}")
+
+    if response.status_code == 304 and cached:
+        return _touch(cached, "revalidated")
+    if response.status_code != 200:
+        if cached and response.status_code >= 500:
+            print(f"   📦 server error {response.status_code}, using cached script {cached.sha256[:12]}")
+            return _touch(cached, "offline")
+        raise ScriptFetchError(f"failed to fetch {url}: http {response.status_code}")
+    if len(response.content) > MAX_SCRIPT_BYTES:
+        raise ScriptFetchError(f"script at {url} is larger than {MAX_SCRIPT_BYTES} bytes")
+
+    now = time.time()
+    with _lock:
+        sha256 = _store_object(response.content)
+        entry = CacheEntry(
+            url=url,
+            sha256=sha256,
+            size=len(response.content),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=now,
+            last_used=now,
+        )
+        index = _load_index()
+        index[url] = entry
+        _save_index(index)
+    return ResolvedScript(url, sha256, _object_path(sha256), "network")
+
+
+def _touch(entry: CacheEntry, source: str) -> ResolvedScript:
+    with _lock:
+        index = _load_index()
+        if url_entry := index.get(entry.url):
+            url_entry.last_used = time.time()
+            _save_index(index)
+    return ResolvedScript(entry.url, entry.sha256, _object_path(entry.sha256), source)
+
+
+def build_cached_command(pipe: PipeInstall, script: ResolvedScript) -> str:
+    """
+    Run the cached bytes exactly as the pipeline would: fed to the
+    interpreter on stdin, with the same interpreter arguments.
+    """
+    tokens = (["sudo"] if pipe.sudo else []) + [pipe.interpreter] + pipe.interpreter_args
+    return f"{' '.join(shlex.quote(token) for token in tokens)} < {shlex.quote(script.path)}"
+
+
+def list_cache() -> List[CacheEntry]:
+    with _lock:
+        return sorted(_load_index().values(), key=lambda entry: entry.last_used, reverse=True)
+
+
+def prune_cache(max_age_days: float = 30.0) -> int:
+    """
+    Drop index entries unused for max_age_days and delete every object that
+    neither an entry nor a live task checkpoint points to. A checkpoint's
+    pinned bytes must survive an upstream change so its resume re-runs
+    exactly what ran before.
+
+    Returns:
+        Number of objects deleted
+    """
+    # imported here: checkpoints sit above the executor, which imports this module
+    from agent.checkpoints import pinned_scripts
+
+    cutoff = time.time() - max_age_days * 24 * 3600
+    objects_dir = os.path.join(CACHE_DIR, "objects")
+    pinned = pinned_scripts()
+    with _lock:
+        index = {url: entry for url, entry in _load_index().items() if entry.last_used >= cutoff}
+        _save_index(index)
+        keep = {entry.sha256 for entry in index.values()} | pinned
+        removed = 0
+        if os.path.isdir(objects_dir):
+            for name in os.listdir(objects_dir):
+                if name not in keep:
+                    os.remove(os.path.join(objects_dir, name))
+                    removed += 1
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="luna installer script cache")
+    commands = parser.add_subparsers(dest="action", required=True)
+    commands.add_parser("list", help="show cached scripts")
+    prune = commands.add_parser("prune", help="remove unused scripts")
+    prune.add_argument("--max-age-days", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.action == "list":
+        for entry in list_cache():
+            print(f"{entry.sha256[:12]}  {entry.size:>8}  {entry.url}")
+    else:
+        print(f"removed {prune_cache(args.max_age_days)} cached scripts")
+
+
+if __name__ == "__main__":
+    main()
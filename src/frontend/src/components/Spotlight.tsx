@@ -13,6 +13,8 @@ import { useState } from "react";
 import {
   executeAllSteps,
   executeCommand,
+  resumeTask,
+  type ExecuteAllResponse,
   type ExecuteCommandResponse,
 } from "../utils/api";
 
@@ -64,41 +66,37 @@ export function Spotlight() {
     }
   };
 
-  const handleConfirm = async () => {
-    if (!executionPlan) return;
+  const applyResults = (response: ExecuteAllResponse) => {
+    setSteps((prev) =>
+      prev.map((step) => {
+        const result = response.results.find((r) => r.step_id === step.id);
+        if (result) {
+          return {
+            ...step,
+            status: result.status,
+            output: result.output,
+            error: result.error || undefined,
+          };
+        }
+        return step;
+      })
+    );
+  };
 
+  const runSteps = async (run: () => Promise<ExecuteAllResponse>) => {
     setIsExecuting(true);
     setError(null);
 
-    // set all steps to running
-    setSteps((prev) => prev.map((s) => ({ ...s, status: "running" as const })));
+    // set all unfinished steps to running
+    setSteps((prev) =>
+      prev.map((s) =>
+        s.status === "completed" ? s : { ...s, status: "running" as const }
+      )
+    );
 
     try {
-      const response = await executeAllSteps({
-        task_id: executionPlan.task_id,
-        steps: steps.map((s) => ({
-          id: s.id,
-          command: s.command,
-          description: s.description,
-        })),
-      });
-
-      // update steps with results
-      setSteps((prev) =>
-        prev.map((step) => {
-          const result = response.results.find((r) => r.step_id === step.id);
-          if (result) {
-            return {
-              ...step,
-              status: result.status,
-              output: result.output,
-              error: result.error || undefined,
-            };
-          }
-          return step;
-        })
-      );
-
+      const response = await run();
+      applyResults(response);
       console.log("execution results:", response);
     } catch (err) {
       setError(err instanceof Error ? err.message : "execution failed");
@@ -114,6 +112,33 @@ export function Spotlight() {
     }
   };
 
+  const handleConfirm = async () => {
+    if (!executionPlan) return;
+
+    await runSteps(() =>
+      executeAllSteps(
+        executionPlan.plan_id
+          ? { plan_id: executionPlan.plan_id }
+          : {
+              task_id: executionPlan.task_id,
+              steps: steps.map((s) => ({
+                id: s.id,
+                command: s.command,
+                description: s.description,
+              })),
+            }
+      )
+    );
+  };
+
+  const handleResume = async () => {
+    if (!executionPlan?.plan_id) return;
+    const planId = executionPlan.plan_id;
+
+    // continue from the failed step; completed steps are not re-run
+    await runSteps(() => resumeTask({ plan_id: planId }));
+  };
+
   const handleCancel = () => {
     setExecutionPlan(null);
     setSteps([]);
@@ -292,6 +317,26 @@ export function Spotlight() {
                   <span>requires confirmation before execution</span>
                 </div>
               )}
+
+              {executionPlan.template && (
+                <div className="mt-2 text-xs text-slate-400 bg-slate-900/40 border border-slate-700/30 rounded-lg px-3 py-2">
+                  reused plan from "{executionPlan.template.request}"
+                  {executionPlan.template.slot &&
+                    ` (${executionPlan.template.slot[0]} → ${executionPlan.template.slot[1]})`}
+                </div>
+              )}
+
+              {executionPlan.optimizations &&
+                executionPlan.optimizations.length > 0 && (
+                  <div className="mt-2 space-y-1 text-xs text-slate-400 bg-slate-900/40 border border-slate-700/30 rounded-lg px-3 py-2">
+                    <p className="text-slate-500">plan optimized:</p>
+                    {executionPlan.optimizations.map((rewrite) => (
+                      <p key={`${rewrite.kind}-${rewrite.step_ids.join("-")}`}>
+                        • {rewrite.detail}
+                      </p>
+                    ))}
+                  </div>
+                )}
             </div>
 
             {/* steps */}
@@ -371,6 +416,16 @@ export function Spotlight() {
                   execute {steps.length} step{steps.length > 1 ? "s" : ""}
                 </button>
               )}
+              {!isExecuting &&
+                executionPlan.plan_id &&
+                steps.some((s) => s.status === "failed") && (
+                  <button
+                    onClick={handleResume}
+                    className="flex-1 px-6 py-3 bg-primary-500 hover:bg-primary-600 text-white rounded-xl font-medium transition-colors"
+                  >
+                    resume from failed step
+                  </button>
+                )}
               {(isExecuting ||
                 steps.some(
                   (s) => s.status === "completed" || s.status === "failed"
@@ -17,14 +17,32 @@ export interface ExecuteCommandResponse {
     command: string;
     risk: "safe" | "moderate" | "dangerous";
     status?: "pending" | "running" | "completed" | "failed";
+    source_step_ids?: number[] | null;
   }>;
   requires_confirmation: boolean;
   estimated_time?: string;
+  plan_id?: string;
+  plan_expires_at?: number;
+  optimizations?: Array<{
+    kind: "merge_installs" | "drop_probe";
+    step_ids: number[];
+    detail: string;
+  }>;
+  source?: "llm" | "template" | "builtin";
+  // set when the plan was adapted from an earlier successful one
+  template?: {
+    request: string;
+    similarity: number;
+    slot: [string, string] | null;
+  } | null;
 }
 
 export interface ExecuteAllRequest {
-  task_id: string;
-  steps: Array<{
+  plan_id?: string;
+  step_ids?: number[];
+  // legacy: send the full steps array when no plan_id is available
+  task_id?: string;
+  steps?: Array<{
     id: number;
     command: string;
     description: string;
@@ -38,8 +56,22 @@ export interface ExecuteAllResponse {
     status: "completed" | "failed";
     output: string;
     error: string | null;
+    source_step_ids?: number[] | null;
+    from_checkpoint?: boolean;
+    script?: {
+      url: string;
+      sha256: string;
+      source: "network" | "revalidated" | "offline" | "pinned";
+    } | null;
   }>;
   overall_status: "completed" | "failed" | "partial";
+  plan_id?: string | null;
+}
+
+export interface ResumeRequest {
+  plan_id: string;
+  edited_command?: string;
+  rerun_step_ids?: number[];
 }
 
 export async function executeCommand(
@@ -78,6 +110,80 @@ export async function executeAllSteps(
   return response.json();
 }
 
+export async function resumeTask(
+  request: ResumeRequest
+): Promise<ExecuteAllResponse> {
+  const response = await fetch(`${API_BASE_URL}/api/execute/resume`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify(request),
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.statusText}`);
+  }
+
+  return response.json();
+}
+
+export interface WatchResponse {
+  watch_id: string;
+  plan_id: string;
+  step_ids: number[];
+  interval_s: number;
+}
+
+export interface WatchEvent {
+  type: "snapshot" | "change";
+  watch_id: string;
+  runs: number;
+  steps: Array<{
+    step_id: number;
+    status: "pending" | "completed" | "failed";
+    hash: string | null;
+    output?: string;
+    diff?: string[];
+    error: string | null;
+  }>;
+}
+
+export async function createWatch(request: {
+  plan_id: string;
+  step_ids?: number[];
+  interval_s?: number;
+}): Promise<WatchResponse> {
+  const response = await fetch(`${API_BASE_URL}/api/watch`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify(request),
+  });
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.statusText}`);
+  }
+
+  return response.json();
+}
+
+// subscribe to a watch; returns a function that closes the stream
+export function subscribeWatch(
+  watchId: string,
+  onEvent: (event: WatchEvent) => void
+): () => void {
+  const source = new EventSource(`${API_BASE_URL}/api/watch/${watchId}/events`);
+  source.onmessage = (message) => onEvent(JSON.parse(message.data));
+  source.addEventListener("end", () => source.close());
+  return () => source.close();
+}
+
+export async function cancelWatch(watchId: string): Promise<void> {
+  await fetch(`${API_BASE_URL}/api/watch/${watchId}`, { method: "DELETE" });
+}
+
 export async function healthCheck(): Promise<{ status: string }> {
   const response = await fetch(`${API_BASE_URL}/health`);
   return response.json();
@@ -0,0 +1,17 @@
+"""
+shared pytest setup - backend import path and throwaway state directories
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# modules read these at import time; never touch the real ~/.luna from tests
+_STATE_DIR = tempfile.mkdtemp(prefix="luna-tests-")
+os.environ.setdefault("LUNA_CHECKPOINT_DIR", os.path.join(_STATE_DIR, "checkpoints"))
+os.environ.setdefault("LUNA_SCRIPT_CACHE_DIR", os.path.join(_STATE_DIR, "script-cache"))
+os.environ.setdefault("LUNA_PLAN_INDEX_PATH", os.path.join(_STATE_DIR, "plan-index.json"))
+os.environ.setdefault("OPENAI_API_KEY", "")
@@ -0,0 +1,119 @@
+"""
+checkpointed runs: nothing security-relevant is trusted from the file on disk
+"""
+
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agent import checkpoints
+from agent.plan_registry import analyze_step, register_plan
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def write_checkpoint(steps) -> str:
+    plan_id = uuid.uuid4().hex
+    checkpoints.start_checkpoint(plan_id, "task_test", steps)
+    return plan_id
+
+
+def edit_checkpoint(plan_id: str, edit) -> None:
+    path = os.path.join(checkpoints.CHECKPOINT_DIR, f"{plan_id}.json")
+    with open(path) as f:
+        data = json.load(f)
+    edit(data)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def test_only_planner_fields_are_stored():
+    plan_id = write_checkpoint([analyze_step(1, "say hi", "echo hi", "safe")])
+
+    path = os.path.join(checkpoints.CHECKPOINT_DIR, f"{plan_id}.json")
+    with open(path) as f:
+        stored = json.load(f)["steps"][0]["step"]
+
+    assert set(stored) == {"id", "description", "command", "risk", "source_step_ids"}
+
+
+def test_edited_checkpoint_is_reanalyzed_on_load(client):
+    plan_id = write_checkpoint([analyze_step(1, "say hi", "echo hi", "safe")])
+
+    def inject(data):
+        data["steps"][0]["step"].update({
+            "command": "echo 'dd if=/dev/zero of=/tmp/luna-test'",
+            "command_hash": "forged",
+            "is_safe": True,
+            "block_reason": None,
+            "env_overrides": {"LD_PRELOAD_TEST": "/tmp/evil.so"},
+        })
+    edit_checkpoint(plan_id, inject)
+
+    step = checkpoints.load_checkpoint(plan_id).steps[0].step
+    assert step.is_safe is False
+    assert "LD_PRELOAD_TEST" not in step.env_overrides
+
+    response = client.post("/api/execute/resume", json={"plan_id": plan_id})
+    assert response.status_code == 200
+    result = response.json()["results"][0]
+    assert result["status"] == "failed"
+    assert "blocked" in result["error"]
+
+
+def test_malformed_checkpoint_is_rejected(client):
+    plan_id = write_checkpoint([analyze_step(1, "say hi", "echo hi", "safe")])
+    edit_checkpoint(plan_id, lambda data: data["steps"][0]["step"].pop("command"))
+
+    response = client.post("/api/execute/resume", json={"plan_id": plan_id})
+
+    assert response.status_code == 409
+
+
+def test_resume_skips_completed_steps(client):
+    plan_id = write_checkpoint([
+        analyze_step(1, "first", "echo one", "safe"),
+        analyze_step(2, "second", "echo two", "safe"),
+    ])
+    checkpoint = checkpoints.load_checkpoint(plan_id)
+    checkpoints.record_step(checkpoint, 1, "completed", "one\n", None)
+
+    response = client.post("/api/execute/resume", json={"plan_id": plan_id})
+
+    results = response.json()["results"]
+    assert [r["from_checkpoint"] for r in results] == [True, False]
+    assert response.json()["overall_status"] == "completed"
+
+
+def test_run_and_resume_refuse_a_plan_that_is_running(client):
+    plan_id = write_checkpoint([analyze_step(1, "say hi", "echo hi", "safe")])
+
+    planned = register_plan("task_test", [analyze_step(1, "say hi", "echo hi", "safe")])
+
+    with checkpoints.claim_run(plan_id), checkpoints.claim_run(planned.plan_id):
+        resumed = client.post("/api/execute/resume", json={"plan_id": plan_id})
+        ran = client.post("/api/execute/run", json={"plan_id": planned.plan_id})
+    assert resumed.status_code == 409
+    assert ran.status_code == 409
+
+    # released afterwards
+    assert client.post("/api/execute/resume", json={"plan_id": plan_id}).status_code == 200
+    assert client.post("/api/execute/run", json={"plan_id": planned.plan_id}).status_code == 200
+
+
+def test_concurrent_resumes_run_steps_once(client):
+    plan_id = write_checkpoint([analyze_step(1, "wait", "sleep 0.5", "safe")])
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(client.post, "/api/execute/resume", json={"plan_id": plan_id}) for _ in range(2)]
+        statuses = sorted(future.result().status_code for future in futures)
+
+    assert statuses == [200, 409]
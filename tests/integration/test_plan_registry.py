@@ -0,0 +1,83 @@
+"""
+/api/execute/run only runs stored plans: tampered, unknown and expired
+plans are refused, and step subsets keep plan order
+"""
+
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agent.plan_registry import analyze_step, register_plan
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def plan():
+    return register_plan("task_test", [
+        analyze_step(1, "first", "echo one", "safe"),
+        analyze_step(2, "second", "echo two", "safe"),
+        analyze_step(3, "third", "echo three", "safe"),
+    ])
+
+
+def run(client, **body):
+    return client.post("/api/execute/run", json=body)
+
+
+def test_submitted_commands_matching_the_plan_run(client, plan):
+    steps = [{"id": step.id, "command": step.command} for step in plan.steps]
+
+    response = run(client, plan_id=plan.plan_id, steps=steps)
+
+    assert response.status_code == 200
+    assert response.json()["overall_status"] == "completed"
+
+
+def test_mismatched_submitted_command_is_refused(client, plan):
+    steps = [{"id": 1, "command": "echo one"}, {"id": 2, "command": "rm -rf ~/project"}]
+
+    response = run(client, plan_id=plan.plan_id, steps=steps)
+
+    assert response.status_code == 409
+
+
+def test_unknown_plan_is_not_found(client):
+    assert run(client, plan_id="0" * 32).status_code == 404
+
+
+def test_expired_plan_is_not_found(client, plan):
+    plan.expires_at = time.time() - 1
+
+    assert run(client, plan_id=plan.plan_id).status_code == 404
+
+
+def test_step_subset_keeps_plan_order(client, plan):
+    response = run(client, plan_id=plan.plan_id, step_ids=[3, 1])
+
+    assert response.status_code == 200
+    assert [result["step_id"] for result in response.json()["results"]] == [1, 3]
+
+
+def test_unknown_step_id_is_rejected(client, plan):
+    assert run(client, plan_id=plan.plan_id, step_ids=[1, 7]).status_code == 400
+
+
+def test_steps_without_a_plan_are_refused_by_default(client):
+    response = run(client, steps=[{"id": 1, "command": "echo hi"}])
+
+    assert response.status_code == 400
+
+
+def test_steps_without_a_plan_need_the_opt_in(client, monkeypatch):
+    monkeypatch.setattr(main, "ALLOW_UNPLANNED_STEPS", True)
+
+    response = run(client, steps=[{"id": 1, "command": "echo hi"}])
+
+    assert response.status_code == 200
+    assert response.json()["results"][0]["output"].strip() == "hi"
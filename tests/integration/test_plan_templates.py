@@ -0,0 +1,79 @@
+"""
+plan templates: successful runs and resumes are recorded, with the
+planner's time estimate
+"""
+
+import platform
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agent.plan_registry import analyze_step, get_plan, register_plan
+from knowledge.plan_index import PlanIndex
+
+OS_TYPE = platform.system().lower()
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = PlanIndex(path=str(tmp_path / "plan-index.json"))
+    monkeypatch.setattr(main, "plan_index", index)
+    return index
+
+
+def test_plan_keeps_the_estimated_time(client):
+    response = client.post("/api/execute", json={"command": "check docker"}).json()
+
+    assert get_plan(response["plan_id"]).estimated_time == response["estimated_time"]
+
+
+def test_successful_run_records_template_with_estimate(client, index):
+    plan = register_plan("task_test", [analyze_step(1, "greet alice", "echo hello alice", "safe")],
+                         request="greet alice", source="llm", estimated_time="1 second")
+
+    client.post("/api/execute/run", json={"plan_id": plan.plan_id})
+
+    match = index.lookup("greet bob", OS_TYPE)
+    assert [step["command"] for step in match.steps] == ["echo hello bob"]
+    assert match.estimated_time == "1 second"
+
+
+def test_failed_run_records_nothing(client, index):
+    plan = register_plan("task_test", [
+        analyze_step(1, "greet alice", "echo hello alice", "safe"),
+        analyze_step(2, "fails", "false", "moderate"),
+    ], request="greet alice", source="llm")
+
+    client.post("/api/execute/run", json={"plan_id": plan.plan_id})
+
+    assert index.stats()["templates"] == 0
+
+
+def test_successful_resume_records_template(client, index):
+    plan = register_plan("task_test", [
+        analyze_step(1, "greet alice", "echo hello alice", "safe"),
+        analyze_step(2, "finish", "false", "moderate"),
+    ], request="greet alice", source="llm", estimated_time="2 seconds")
+    client.post("/api/execute/run", json={"plan_id": plan.plan_id})
+
+    resumed = client.post("/api/execute/resume", json={"plan_id": plan.plan_id, "edited_command": "true"})
+
+    assert resumed.json()["overall_status"] == "completed"
+    match = index.lookup("greet bob", OS_TYPE)
+    assert [step["command"] for step in match.steps] == ["echo hello bob", "true"]
+    assert match.estimated_time == "2 seconds"
+
+
+def test_builtin_plans_are_not_recorded(client, index):
+    plan = register_plan("task_test", [analyze_step(1, "greet alice", "echo hello alice", "safe")],
+                         request="greet alice")
+
+    client.post("/api/execute/run", json={"plan_id": plan.plan_id})
+
+    assert index.stats()["templates"] == 0
@@ -0,0 +1,244 @@
+"""
+llm resilience against local fake openai servers: budget fallback,
+circuit breaker with probe recovery, hedging and failover
+"""
+
+import time
+
+import pytest
+from openai import OpenAI
+
+from agent.resilience import (
+    CircuitBreaker,
+    LatencyTracker,
+    LLMProvider,
+    PlannerUnavailable,
+    ResilientPlanner,
+)
+from bench.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "install node"}]
+
+
+@pytest.fixture
+def primary():
+    with FakeOpenAIServer(FakeOpenAIConfig(latency_ms=50, jitter_ms=0)) as server:
+        yield server
+
+
+@pytest.fixture
+def backup():
+    with FakeOpenAIServer(FakeOpenAIConfig(latency_ms=50, jitter_ms=0)) as server:
+        yield server
+
+
+def make_provider(name: str, server: FakeOpenAIServer, threshold: int = 3,
+                  cooldown_s: float = 30.0, timeout_s: float = 5.0) -> LLMProvider:
+    provider = LLMProvider(
+        name=name,
+        client=OpenAI(base_url=server.base_url, api_key="fake"),
+        model="gpt-4o-mini",
+        breaker=CircuitBreaker(name, failure_threshold=threshold, cooldown_s=cooldown_s),
+        latency=LatencyTracker(),
+        timeout_s=timeout_s,
+    )
+    provider.breaker.probe = provider.probe
+    return provider
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_completes_within_budget(primary):
+    planner = ResilientPlanner([make_provider("openai", primary)], budget_s=2.0)
+
+    completion, provider = planner.complete(MESSAGES)
+
+    assert provider == "openai"
+    assert '"steps"' in completion.choices[0].message.content
+
+
+def test_streamed_completion_is_assembled(primary):
+    provider = make_provider("openai", primary)
+    provider.stream = True
+    planner = ResilientPlanner([provider], budget_s=2.0)
+
+    completion, _ = planner.complete(MESSAGES)
+
+    assert '"steps"' in completion.choices[0].message.content
+    assert completion.choices[0].finish_reason == "stop"
+    assert completion.usage.prompt_tokens > 0
+    assert primary.stats.as_dict()["streamed"] == 1
+
+
+def test_budget_exhaustion_falls_back_quickly(primary):
+    primary.config.latency_ms = 800
+    planner = ResilientPlanner([make_provider("openai", primary)], budget_s=0.2, hedge=False)
+
+    started = time.monotonic()
+    with pytest.raises(PlannerUnavailable, match="budget"):
+        planner.complete(MESSAGES)
+
+    assert time.monotonic() - started < 0.6
+
+
+def test_short_budgets_do_not_open_the_circuit(primary):
+    primary.config.latency_ms = 300
+    provider = make_provider("openai", primary, threshold=3)
+    planner = ResilientPlanner([provider], hedge=False)
+
+    for _ in range(3):
+        with pytest.raises(PlannerUnavailable):
+            planner.complete(MESSAGES, budget_s=0.05)
+
+    # abandoned calls still finish and count as successes
+    assert wait_until(lambda: len(provider.latency) == 3)
+    assert provider.breaker.state == "closed"
+    _, name = planner.complete(MESSAGES, budget_s=2.0)
+    assert name == "openai"
+
+
+def test_provider_timeout_counts_as_failure(primary):
+    primary.config.latency_ms = 600
+    provider = make_provider("openai", primary, threshold=1, timeout_s=0.2)
+    planner = ResilientPlanner([provider], budget_s=2.0, hedge=False)
+
+    with pytest.raises(PlannerUnavailable):
+        planner.complete(MESSAGES)
+
+    assert provider.breaker.state == "open"
+
+
+def test_breaker_opens_and_probe_recovers(primary):
+    primary.config.failure_rate = 1.0
+    provider = make_provider("openai", primary, threshold=3, cooldown_s=0.2)
+    planner = ResilientPlanner([provider], budget_s=2.0, hedge=False)
+
+    for _ in range(3):
+        with pytest.raises(PlannerUnavailable):
+            planner.complete(MESSAGES)
+    assert provider.breaker.state == "open"
+
+    # open circuit: rejected without reaching the server
+    requests_before = primary.stats.as_dict()["requests"]
+    with pytest.raises(PlannerUnavailable, match="circuit open"):
+        planner.complete(MESSAGES)
+    assert primary.stats.as_dict()["requests"] == requests_before
+
+    # the background probe (GET /models) closes the circuit once healthy
+    primary.config.failure_rate = 0.0
+    assert wait_until(lambda: provider.breaker.state == "closed")
+    _, name = planner.complete(MESSAGES)
+    assert name == "openai"
+
+
+def test_hedge_fires_after_p95_delay(primary, backup):
+    primary.config.latency_ms = 1000
+    slow = make_provider("openai", primary)
+    for _ in range(5):
+        slow.latency.add(0.1)  # p95 of 100ms
+    planner = ResilientPlanner([slow, make_provider("ollama", backup)], budget_s=3.0, hedge=True)
+
+    started = time.monotonic()
+    _, name = planner.complete(MESSAGES)
+
+    assert name == "ollama"
+    assert time.monotonic() - started < 0.6
+    assert backup.stats.as_dict()["requests"] == 1
+
+
+def test_no_hedge_before_delay(primary, backup):
+    primary.config.latency_ms = 200
+    planner = ResilientPlanner(
+        [make_provider("openai", primary), make_provider("ollama", backup)],
+        budget_s=3.0, hedge=True, default_hedge_delay_s=2.0,
+    )
+
+    _, name = planner.complete(MESSAGES)
+
+    assert name == "openai"
+    assert backup.stats.as_dict()["requests"] == 0
+
+
+def test_failover_to_next_provider_on_error(primary, backup):
+    primary.config.failure_rate = 1.0
+    planner = ResilientPlanner(
+        [make_provider("openai", primary), make_provider("ollama", backup)],
+        budget_s=3.0, hedge=False,
+    )
+
+    _, name = planner.complete(MESSAGES)
+
+    assert name == "ollama"
+    assert primary.stats.as_dict()["failures"] == 1
+
+
+def test_failover_skips_open_circuit(primary, backup):
+    primary.config.failure_rate = 1.0
+    first = make_provider("openai", primary, threshold=1)
+    planner = ResilientPlanner([first, make_provider("ollama", backup)], budget_s=3.0, hedge=False)
+
+    planner.complete(MESSAGES)
+    assert first.breaker.state == "open"
+    requests_before = primary.stats.as_dict()["requests"]
+
+    _, name = planner.complete(MESSAGES)
+
+    assert name == "ollama"
+    assert primary.stats.as_dict()["requests"] == requests_before
+
+
+def test_queued_calls_are_cancelled_when_the_budget_runs_out(primary):
+    primary.config.latency_ms = 600
+    provider = make_provider("openai", primary, threshold=1)
+    planner = ResilientPlanner([provider], hedge=False, max_workers=1)
+
+    # the only worker is busy with the first call; the second never starts
+    for _ in range(2):
+        with pytest.raises(PlannerUnavailable):
+            planner.complete(MESSAGES, budget_s=0.1)
+
+    assert wait_until(lambda: len(provider.latency) == 1)
+    # long enough for a wrongly sent second call to finish as well
+    time.sleep(0.9)
+    assert len(provider.latency) == 1
+    assert primary.stats.as_dict()["requests"] == 1
+    assert provider.breaker.state == "closed"
+
+
+def test_cancelled_trial_is_released(primary):
+    primary.config.latency_ms = 600
+    breaker = CircuitBreaker("openai", failure_threshold=1, cooldown_s=0.0)
+    breaker.record_failure()
+    provider = make_provider("openai", primary)
+    provider.breaker = breaker  # no probe: one half-open trial at a time
+    planner = ResilientPlanner([provider], hedge=False, max_workers=1)
+    busy = planner._pool.submit(time.sleep, 0.3)
+
+    with pytest.raises(PlannerUnavailable, match="not started"):
+        planner.complete(MESSAGES, budget_s=0.1)
+
+    busy.result()
+    assert breaker.allow()
+
+
+def test_hedge_delay_counts_from_when_the_call_starts(primary, backup):
+    primary.config.latency_ms = 300
+    planner = ResilientPlanner(
+        [make_provider("openai", primary), make_provider("ollama", backup)],
+        budget_s=3.0, hedge=True, default_hedge_delay_s=0.5, max_workers=1,
+    )
+    # the pool is busy for longer than the hedge delay before the first call starts
+    planner._pool.submit(time.sleep, 0.6)
+
+    _, name = planner.complete(MESSAGES)
+
+    assert name == "openai"
+    time.sleep(0.5)
+    assert backup.stats.as_dict()["requests"] == 0
@@ -0,0 +1,167 @@
+"""
+installer script cache against a local fake script server: revalidation,
+offline reuse, pinned re-runs on resume and pruning
+"""
+
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agent import checkpoints
+from agent.plan_registry import analyze_step, register_plan
+from bench.fake_script_server import FakeScriptServer
+from utils import script_cache
+from utils.script_cache import ScriptFetchError, prune_cache, resolve_script
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(script_cache, "CACHE_DIR", str(tmp_path / "script-cache"))
+    return tmp_path / "script-cache"
+
+
+@pytest.fixture
+def server():
+    with FakeScriptServer() as server:
+        server.set_script("install.sh", "#!/bin/bash\necho 'installer v1'\n")
+        yield server
+
+
+def test_network_then_revalidated_then_offline_then_changed(server):
+    url = server.url("install.sh")
+
+    first = resolve_script(url)
+    assert first.source == "network"
+    assert server.counts["full"] == 1
+
+    second = resolve_script(url)
+    assert second.source == "revalidated"
+    assert second.sha256 == first.sha256
+    assert server.counts == {"full": 1, "not_modified": 1, "errors": 0}
+
+    server.down = True
+    offline = resolve_script(url)
+    assert offline.source == "offline"
+    assert offline.sha256 == first.sha256
+
+    server.down = False
+    server.set_script("install.sh", "#!/bin/bash\necho 'installer v2'\n")
+    changed = resolve_script(url)
+    assert changed.source == "network"
+    assert changed.sha256 != first.sha256
+    with open(changed.path) as f:
+        assert "installer v2" in f.read()
+    assert [entry.sha256 for entry in script_cache.list_cache()] == [changed.sha256]
+
+
+def test_offline_without_cached_copy_fails(server):
+    server.down = True
+
+    with pytest.raises(ScriptFetchError):
+        resolve_script(server.url("install.sh"))
+
+
+def test_pinned_script_skips_the_network(server):
+    url = server.url("install.sh")
+    pinned = resolve_script(url)
+    server.set_script("install.sh", "echo changed")
+    server.down = True
+
+    again = resolve_script(url, pinned_sha256=pinned.sha256)
+
+    assert again.source == "pinned"
+    assert again.sha256 == pinned.sha256
+    assert server.counts["errors"] == 0
+
+
+def test_pinned_script_is_verified(server):
+    pinned = resolve_script(server.url("install.sh"))
+    with open(pinned.path, "a") as f:
+        f.write("echo tampered\n")
+
+    with pytest.raises(ScriptFetchError):
+        resolve_script(server.url("install.sh"), pinned_sha256=pinned.sha256)
+
+
+def test_resume_reruns_the_pinned_script(server):
+    client = TestClient(main.app)
+    plan = register_plan("task_test", [
+        analyze_step(1, "run installer", f"curl -fsSL {server.url('install.sh')} | bash", "moderate"),
+        analyze_step(2, "fails", "false", "moderate"),
+    ])
+
+    run = client.post("/api/execute/run", json={"plan_id": plan.plan_id}).json()
+    first = run["results"][0]
+    assert first["status"] == "completed"
+    assert first["script"]["source"] == "network"
+    assert "installer v1" in first["output"]
+    assert run["overall_status"] == "failed"
+
+    # the server now serves different bytes; the re-run must use the pinned ones
+    server.set_script("install.sh", "#!/bin/bash\necho 'installer v2'\n")
+    resumed = client.post("/api/execute/resume", json={"plan_id": plan.plan_id, "rerun_step_ids": [1]}).json()
+
+    rerun = resumed["results"][0]
+    assert rerun["from_checkpoint"] is False
+    assert rerun["script"]["source"] == "pinned"
+    assert rerun["script"]["sha256"] == first["script"]["sha256"]
+    assert "installer v1" in rerun["output"]
+
+
+def run_then_change_script(client, server):
+    """Run an installer step that then fails the plan, and change the script upstream."""
+    plan = register_plan("task_test", [
+        analyze_step(1, "run installer", f"curl -fsSL {server.url('install.sh')} | bash", "moderate"),
+        analyze_step(2, "fails", "false", "moderate"),
+    ])
+    run = client.post("/api/execute/run", json={"plan_id": plan.plan_id}).json()
+    server.set_script("install.sh", "#!/bin/bash\necho 'installer v2'\n")
+    resolve_script(server.url("install.sh"))
+    return plan.plan_id, run["results"][0]["script"]["sha256"]
+
+
+def test_prune_keeps_scripts_pinned_by_checkpoints(server):
+    client = TestClient(main.app)
+    plan_id, pinned = run_then_change_script(client, server)
+
+    # the index now points at v2; v1 is only referenced by the checkpoint
+    assert prune_cache(max_age_days=1) == 0
+    assert pinned in checkpoints.pinned_scripts()
+
+    resumed = client.post("/api/execute/resume", json={"plan_id": plan_id, "rerun_step_ids": [1]}).json()
+    assert resumed["results"][0]["script"]["source"] == "pinned"
+    assert "installer v1" in resumed["results"][0]["output"]
+
+
+def test_missing_pinned_script_fails_the_step(server, cache_dir):
+    client = TestClient(main.app)
+    plan_id, pinned = run_then_change_script(client, server)
+    os.remove(cache_dir / "objects" / pinned)
+
+    resumed = client.post("/api/execute/resume", json={"plan_id": plan_id, "rerun_step_ids": [1]}).json()
+
+    result = resumed["results"][0]
+    assert result["status"] == "failed"
+    assert "installer script unavailable" in result["error"]
+    assert server.counts["full"] == 2
+
+
+def test_prune_removes_stale_entries_and_orphans(server, cache_dir):
+    server.set_script("other.sh", "echo other")
+    kept = resolve_script(server.url("install.sh"))
+    stale = resolve_script(server.url("other.sh"))
+    orphan = cache_dir / "objects" / ("0" * 64)
+    orphan.write_text("echo orphan")
+
+    index = script_cache._load_index()
+    index[stale.url].last_used = time.time() - 10 * 24 * 3600
+    script_cache._save_index(index)
+
+    assert prune_cache(max_age_days=1) == 2
+    assert os.path.exists(kept.path)
+    assert not os.path.exists(stale.path)
+    assert not orphan.exists()
+    assert [entry.url for entry in script_cache.list_cache()] == [kept.url]
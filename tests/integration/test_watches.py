@@ -0,0 +1,96 @@
+"""
+watch mode through the api: read-only status plans can be watched, and
+long-running requests never stall the event loop the watch streams share
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agent.plan_registry import analyze_step, register_plan
+from agent.watches import WatchError, WatchScheduler
+from utils.executor import get_risk_level
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("command", ["docker info", "docker version", "docker ps", "docker stats --no-stream"])
+def test_docker_status_commands_are_safe(command):
+    assert get_risk_level(command) == "safe"
+
+
+@pytest.mark.parametrize("command, expected", [
+    # a read-only part never makes a chained command safe
+    ("rm -rf build && df -h", "dangerous"),
+    ("kill -9 1234 && docker version", "dangerous"),
+    ("docker info && docker system prune -af", "moderate"),
+    ("uptime; echo hi > ~/.bashrc", "moderate"),
+    ("docker ps || docker system prune -af", "moderate"),
+    ("echo hi > ~/.bashrc", "moderate"),
+    ("ls | sh", "moderate"),
+    # status commands only count as the whole command or its prefix
+    ("df -h /", "safe"),
+    ("uptimes", "moderate"),
+])
+def test_chained_commands_are_never_safe(command, expected):
+    assert get_risk_level(command) == expected
+
+
+@pytest.mark.parametrize("command", [
+    "docker ps && rm -rf build",
+    "uptime; echo hi > ~/.bashrc",
+    "docker info | sh",
+    "echo $(rm -rf build)",
+])
+def test_watch_rejects_shell_control_even_if_labelled_safe(command):
+    step = replace(analyze_step(1, "status", command, "safe"), risk="safe", is_safe=True, needs_sudo=False)
+    scheduler = WatchScheduler(runner=lambda step: (True, "", ""))
+
+    with pytest.raises(WatchError):
+        scheduler.create("plan_test", [step])
+
+
+def test_check_docker_status_plan_can_be_watched(client):
+    plan = client.post("/api/execute", json={"command": "check docker status"}).json()
+    assert [step["risk"] for step in plan["steps"]] == ["safe"] * len(plan["steps"])
+    assert "docker info" in [step["command"] for step in plan["steps"]]
+
+    response = client.post("/api/watch", json={"plan_id": plan["plan_id"], "interval_s": 60})
+
+    assert response.status_code == 200, response.text
+    watch = response.json()
+    assert watch["step_ids"] == [step["id"] for step in plan["steps"]]
+    assert client.delete(f"/api/watch/{watch['watch_id']}").status_code == 200
+
+
+def test_mutating_plan_cannot_be_watched(client):
+    plan = register_plan("task_test", [
+        analyze_step(1, "check brew", "which brew", "safe"),
+        analyze_step(2, "install slack", "brew install --cask slack", "moderate"),
+    ])
+
+    response = client.post("/api/watch", json={"plan_id": plan.plan_id})
+
+    assert response.status_code == 400
+
+
+def test_running_plan_does_not_block_the_event_loop():
+    plan = register_plan("task_test", [analyze_step(1, "wait", "sleep 1", "safe")])
+
+    # one shared event loop, as under uvicorn
+    with TestClient(main.app) as client, ThreadPoolExecutor(max_workers=1) as pool:
+        run = pool.submit(client.post, "/api/execute/run", json={"plan_id": plan.plan_id})
+        time.sleep(0.2)
+        started = time.monotonic()
+        assert client.get("/health").status_code == 200
+        elapsed = time.monotonic() - started
+        assert run.result().status_code == 200
+
+    assert elapsed < 0.5
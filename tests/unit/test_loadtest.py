@@ -0,0 +1,68 @@
+"""
+load tester report helpers: percentiles, endpoint summaries and the scenario mix
+"""
+
+import pytest
+
+from bench.loadtest import EndpointStats, build_parser, parse_mix, percentile, summarize
+
+VALUES = [float(v) for v in range(1, 101)]
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    (VALUES, 50, 50.0),
+    (VALUES, 95, 95.0),
+    (VALUES, 99, 99.0),
+    (VALUES, 100, 100.0),
+    (VALUES, 0, 1.0),
+    ([7.0], 99, 7.0),
+    ([1.0, 2.0, 3.0], 50, 2.0),
+    ([], 95, 0.0),
+])
+def test_percentile_is_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_summarize():
+    stats = EndpointStats()
+    for latency in [30.0, 10.0, 20.0, 40.0]:
+        stats.record(latency, None)
+    stats.record(50.0, "http 500")
+
+    summary = summarize(stats, elapsed_s=2.0)
+
+    assert summary["requests"] == 5
+    assert summary["errors"] == 1
+    assert summary["error_rate"] == 0.2
+    assert summary["error_kinds"] == {"http 500": 1}
+    assert summary["throughput_rps"] == 2.5
+    assert summary["latency_ms"] == {"min": 10.0, "mean": 30.0, "p50": 20.0, "p95": 50.0, "p99": 50.0, "max": 50.0}
+
+
+def test_summarize_without_requests():
+    summary = summarize(EndpointStats(), elapsed_s=0.0)
+
+    assert summary["requests"] == 0
+    assert summary["error_rate"] == 0.0
+    assert summary["throughput_rps"] == 0.0
+    assert summary["latency_ms"]["p95"] == 0.0
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("plan=3,run=1", [("plan", 3.0), ("run", 1.0)]),
+    ("health", [("health", 1.0)]),
+    (" plan = 2 , health=0.5", [("plan", 2.0), ("health", 0.5)]),
+])
+def test_parse_mix(spec, expected):
+    assert parse_mix(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["plan=3,deploy=1", "plan=lots", ""])
+def test_parse_mix_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_mix(spec)
+
+
+def test_stream_flag():
+    assert build_parser().parse_args(["--spawn", "--stream"]).stream is True
+    assert build_parser().parse_args(["--spawn"]).stream is False
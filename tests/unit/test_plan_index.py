@@ -0,0 +1,81 @@
+"""
+plan index slot substitution: a stored plan is only reused when every
+mention of the old value is rewritten
+"""
+
+from typing import List
+
+import pytest
+
+from knowledge.plan_index import PlanIndex, adapt_steps
+
+
+def make_steps(*steps) -> List[dict]:
+    return [{"id": index + 1, "description": description, "command": command, "risk": "moderate"}
+            for index, (description, command) in enumerate(steps)]
+
+
+SLACK_PLAN = make_steps(
+    ("Install Slack", "brew install --cask slack"),
+    ("check slack", "ls -la /Applications/Slack.app"),
+)
+
+
+@pytest.mark.parametrize("steps, slot, expected, reason", [
+    # every mention is a whole token: rewritten
+    (make_steps(("install node", "brew install node"), ("check node", "node --version")),
+     ("node", "git"), ["brew install git", "git --version"], None),
+    # paths and app names are rewritten too, keeping their case
+    (SLACK_PLAN, ("slack", "zoom"), ["brew install --cask zoom", "ls -la /Applications/Zoom.app"], None),
+    (make_steps(("install slack", "brew install --cask slack"), ("open", "open -a SLACK")),
+     ("slack", "zoom"), ["brew install --cask zoom", "open -a ZOOM"], None),
+    # a substitution may not raise a command's risk
+    (make_steps(("check node", "node --version")), ("node", "deno"), None, "risk_raised"),
+    # a hyphenated name is one name: not rewritten, so the plan is not reused
+    (make_steps(("install react", "npm install react"), ("scaffold", "npx create-react-app web")),
+     ("react", "vue"), None, "leftover_mention"),
+    # the slot is not a parameter of the commands
+    (make_steps(("say hi", "echo hi")), ("node", "deno"), None, "not_a_parameter"),
+    (make_steps(("check slack", "ls -la /Applications/Slack.app")), ("slack", "zoom"), None, "not_a_parameter"),
+    # substituted values must look like a package name
+    (SLACK_PLAN, ("slack", "zoom;rm"), None, "bad_value"),
+])
+def test_adapt_steps(steps, slot, expected, reason):
+    adapted, rejected = adapt_steps(steps, slot)
+
+    assert rejected == reason
+    if expected is None:
+        assert adapted is None
+    else:
+        assert [step["command"] for step in adapted] == expected
+
+
+def test_descriptions_use_the_command_rule():
+    adapted, _ = adapt_steps(SLACK_PLAN, ("slack", "zoom"))
+
+    assert [step["description"] for step in adapted] == ["Install Zoom", "check zoom"]
+
+
+def test_description_with_a_leftover_mention_is_rejected():
+    steps = make_steps(("install nodejs", "brew install node"))
+
+    assert adapt_steps(steps, ("node", "deno")) == (None, "leftover_mention")
+
+
+def test_lookup_adapts_an_install_plan_with_an_app_path(tmp_path):
+    index = PlanIndex(path=str(tmp_path / "plan-index.json"))
+    index.record("install slack", "darwin", SLACK_PLAN)
+
+    match = index.lookup("install zoom", "darwin")
+
+    assert [step["command"] for step in match.steps] == ["brew install --cask zoom", "ls -la /Applications/Zoom.app"]
+    assert index.stats()["hits"] == 1
+
+
+def test_lookup_reports_why_a_candidate_was_rejected(tmp_path):
+    index = PlanIndex(path=str(tmp_path / "plan-index.json"))
+    index.record("check node", "darwin", make_steps(("check node", "node --version")))
+
+    assert index.lookup("check deno", "darwin") is None
+    assert index.stats()["rejected"] == 1
+    assert index.stats()["rejected_by_reason"] == {"risk_raised": 1}
@@ -0,0 +1,131 @@
+"""
+plan optimizer rules: install grouping, probe dropping and source step ids
+"""
+
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from agent.plan_optimizer import optimize_plan
+from utils import executor
+
+
+class Step(BaseModel):
+    """Same shape as main.ExecuteStep, without importing the app."""
+    id: int
+    description: str
+    command: str
+    risk: str = "moderate"
+    source_step_ids: Optional[List[int]] = None
+
+
+def make_steps(commands: List[str]) -> List[Step]:
+    return [Step(id=index + 1, description=f"step {index + 1}", command=command)
+            for index, command in enumerate(commands)]
+
+
+@pytest.fixture(autouse=True)
+def empty_tool_cache():
+    executor._tool_cache.clear()
+    yield
+    executor._tool_cache.clear()
+
+
+@pytest.mark.parametrize("commands, expected, expected_sources", [
+    # same manager and flag set: merged into the first step
+    (["brew install node", "brew install git"], ["brew install node git"], [[1, 2]]),
+    (["brew install --cask slack", "brew install --cask zoom"], ["brew install --cask slack zoom"], [[1, 2]]),
+    (["sudo apt-get install -y git", "sudo apt-get install -y curl"], ["sudo apt-get install -y git curl"], [[1, 2]]),
+    # three steps, repeated package listed once
+    (["npm install -g a", "npm install -g b", "npm install -g a"], ["npm install -g a b"], [[1, 2, 3]]),
+    # different flag sets are different groups
+    (["brew install --cask slack", "brew install git"], ["brew install --cask slack", "brew install git"], [None, None]),
+    (["apt-get install -y git", "apt-get install -y --no-install-recommends curl"],
+     ["apt-get install -y git", "apt-get install -y --no-install-recommends curl"], [None, None]),
+    # sudo and non-sudo never share an invocation
+    (["sudo apt-get install -y git", "apt-get install -y curl"],
+     ["sudo apt-get install -y git", "apt-get install -y curl"], [None, None]),
+    # different managers
+    (["brew install node", "pip install requests"], ["brew install node", "pip install requests"], [None, None]),
+    # only adjacent installs merge
+    (["brew install node", "echo hi", "brew install git"],
+     ["brew install node", "echo hi", "brew install git"], [None, None, None]),
+    # flags that take arguments or shell syntax are left alone
+    (["pip install -r requirements.txt", "pip install requests"],
+     ["pip install -r requirements.txt", "pip install requests"], [None, None]),
+    (["brew install node && brew cleanup", "brew install git"],
+     ["brew install node && brew cleanup", "brew install git"], [None, None]),
+])
+def test_install_grouping(commands, expected, expected_sources):
+    optimized, rewrites = optimize_plan(make_steps(commands))
+
+    assert [step.command for step in optimized] == expected
+    assert [step.source_step_ids for step in optimized] == expected_sources
+    merges = [rewrite for rewrite in rewrites if rewrite["kind"] == "merge_installs"]
+    assert [rewrite["step_ids"] for rewrite in merges] == [s for s in expected_sources if s]
+
+
+@pytest.mark.parametrize("commands, expected, dropped", [
+    # a repeated probe is answered by the first one
+    (["which brew", "which brew"], ["which brew"], [2]),
+    (["command -v node", "which node"], ["command -v node"], [2]),
+    # a state-changing step resets what probes told us
+    (["which node", "brew install node", "which node"], ["which node", "brew install node", "which node"], []),
+    # ...including a merged install
+    (["which node", "brew install node", "brew install git", "which node"],
+     ["which node", "brew install node git", "which node"], []),
+    # read-only steps do not reset it
+    (["which brew", "echo hi", "which brew"], ["which brew", "echo hi"], [3]),
+    # a probe between installs stops them merging
+    (["brew install a", "which a", "brew install b"], ["brew install a", "which a", "brew install b"], []),
+])
+def test_probe_dropping(commands, expected, dropped):
+    optimized, rewrites = optimize_plan(make_steps(commands))
+
+    assert [step.command for step in optimized] == expected
+    drops = [rewrite["step_ids"][0] for rewrite in rewrites if rewrite["kind"] == "drop_probe"]
+    assert drops == dropped
+
+
+@pytest.mark.parametrize("cached, commands, expected", [
+    # known-installed tool: probe dropped before the first mutation
+    ({"brew": True}, ["which brew", "brew install node"], ["brew install node"]),
+    # and a later duplicate probe is dropped as well
+    ({"brew": True}, ["which brew", "echo hi", "which brew"], ["echo hi"]),
+    # after a mutation the cache is no longer trusted
+    ({"brew": True}, ["brew install node", "which brew"], ["brew install node", "which brew"]),
+    # a cached "missing" verdict is never used to drop a probe
+    ({"git": False}, ["which git"], ["which git"]),
+    # unknown tools are probed
+    ({}, ["which brew"], ["which brew"]),
+])
+def test_probe_dropping_from_cached_state(cached, commands, expected):
+    for tool, installed in cached.items():
+        executor.remember_tool_state(tool, installed)
+
+    optimized, _ = optimize_plan(make_steps(commands))
+
+    assert [step.command for step in optimized] == expected
+
+
+def test_merged_step_keeps_first_id_and_strictest_risk():
+    steps = make_steps(["brew install node", "brew install git"])
+    steps[0].risk = "safe"
+    steps[1].risk = "dangerous"
+
+    optimized, _ = optimize_plan(steps)
+
+    assert len(optimized) == 1
+    assert optimized[0].id == 1
+    assert optimized[0].risk == "dangerous"
+    assert optimized[0].description == "step 1; step 2"
+
+
+def test_stale_cache_entry_is_ignored(monkeypatch):
+    executor.remember_tool_state("brew", True)
+    monkeypatch.setattr(executor, "_TOOL_CACHE_DURATION", 0)
+
+    optimized, _ = optimize_plan(make_steps(["which brew"]))
+
+    assert [step.command for step in optimized] == ["which brew"]
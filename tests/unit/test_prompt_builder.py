@@ -0,0 +1,44 @@
+"""
+planner prompt layout: a byte-stable static prefix and a budgeted context
+"""
+
+import pytest
+
+from agent.prompt_builder import STATIC_SYSTEM_PROMPT, build_context_lines, build_messages, estimate_tokens
+
+
+@pytest.mark.parametrize("os_type, package_managers, client_context", [
+    ("darwin", ["brew", "npm"], None),
+    ("linux", ["apt", "pip"], {"project_type": "python", "current_dir": "/srv/app"}),
+    ("windows", [], {"current_dir": "C:\\Users\\luna"}),
+])
+def test_static_prefix_is_byte_identical(os_type, package_managers, client_context):
+    messages = build_messages("install node", os_type, package_managers, client_context)
+
+    assert messages[0] == {"role": "system", "content": STATIC_SYSTEM_PROMPT}
+    assert os_type not in STATIC_SYSTEM_PROMPT
+    assert messages[1]["content"].startswith("CONTEXT:\n- os: ")
+    assert messages[2] == {"role": "user", "content": "install node"}
+
+
+def test_client_context_is_trimmed_to_the_budget():
+    context = {"project_type": "node", "current_dir": "/home/luna/" + "deep/" * 200}
+
+    lines = build_context_lines("linux", ["apt"], context, token_budget=40)
+
+    assert sum(estimate_tokens(line) for line in lines) <= 40
+    assert lines[:2] == ["- os: linux", "- package managers: apt"]
+    assert lines[-1].endswith("...")
+
+
+def test_os_and_package_managers_always_fit():
+    lines = build_context_lines("darwin", ["brew"], {"project_type": "node"}, token_budget=1)
+
+    assert lines == ["- os: darwin", "- package managers: brew"]
+
+
+def test_client_os_never_contradicts_the_detected_one():
+    lines = build_context_lines("linux", ["apt"], {"os": "MacIntel", "project_type": "node"})
+
+    assert not any("MacIntel" in line for line in lines)
+    assert [line for line in lines if "os:" in line] == ["- os: linux"]
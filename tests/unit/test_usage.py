@@ -0,0 +1,79 @@
+"""
+adaptive max_tokens from recorded completion sizes
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from agent import usage
+from agent.usage import DEFAULT_MAX_TOKENS, HEADROOM, MIN_SAMPLES, UsageTracker
+
+
+def completion(tokens: int, finish_reason: str = "stop", cached: int = 0):
+    return SimpleNamespace(
+        usage=SimpleNamespace(
+            prompt_tokens=400,
+            completion_tokens=tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+        ),
+        choices=[SimpleNamespace(finish_reason=finish_reason)],
+    )
+
+
+def record_all(tracker: UsageTracker, command: str, sizes) -> None:
+    for size in sizes:
+        tracker.record(command, "openai", completion(size), max_tokens=DEFAULT_MAX_TOKENS, latency_s=0.5)
+
+
+def test_default_until_enough_samples():
+    tracker = UsageTracker()
+    record_all(tracker, "install node", [200] * (MIN_SAMPLES - 1))
+
+    assert tracker.suggest_max_tokens("install node") == DEFAULT_MAX_TOKENS
+
+
+@pytest.mark.parametrize("sizes, expected", [
+    # p95 plus headroom
+    ([300] * 10, int(300 * HEADROOM) + 32),
+    ([100] * 19 + [400], int(400 * HEADROOM) + 32),
+    # clamped to the floor and the ceiling
+    ([10] * 10, usage.MIN_MAX_TOKENS),
+    ([5000] * 10, usage.MAX_MAX_TOKENS),
+])
+def test_p95_plus_headroom_clamped(sizes, expected):
+    tracker = UsageTracker()
+    record_all(tracker, "install node", sizes)
+
+    assert tracker.suggest_max_tokens("install node") == expected
+
+
+def test_kinds_are_tracked_separately():
+    tracker = UsageTracker()
+    record_all(tracker, "install node", [300] * 10)
+
+    assert tracker.suggest_max_tokens("install node and docker") == DEFAULT_MAX_TOKENS
+    assert tracker.suggest_max_tokens("install git") == tracker.suggest_max_tokens("install node")
+
+
+def test_truncated_plan_raises_the_cap():
+    tracker = UsageTracker()
+    record_all(tracker, "install node", [300] * 19)
+    before = tracker.suggest_max_tokens("install node")
+
+    record = tracker.record("install node", "openai", completion(before, finish_reason="length"),
+                            max_tokens=before, latency_s=0.5)
+
+    assert record.truncated
+    assert tracker.suggest_max_tokens("install node") == usage.MAX_MAX_TOKENS > before
+    assert tracker.summary()["truncated"] == 1
+
+
+def test_summary_counts_cached_tokens():
+    tracker = UsageTracker()
+    tracker.record("install node", "openai", completion(100, cached=200), max_tokens=500, latency_s=0.1)
+
+    summary = tracker.summary()
+
+    assert summary["cached_tokens"] == 200
+    assert summary["cache_hit_ratio"] == 0.5